@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+# boot_secrets.py
+#
+# Boot-time entry point of podman-secrets-loader.service. Every container unit
+# waits on it, so it only reads the manifest written by update_systemd.py on
+# each deploy and sticks to a handful of stdlib imports: no PyYAML, no compose
+# discovery.
+
+import base64
+import hashlib
+import hmac
+import json
+import os
+import re
+import subprocess
+import sys
+
+# gcloud errors of a pinned version that was disabled or destroyed by rotation
+UNAVAILABLE_VERSION_ERRORS = re.compile(r"NOT_FOUND|FAILED_PRECONDITION")
+
+# ============================================================================
+# Configuration
+# ============================================================================
+BOOT_MANIFEST_FILE = os.path.expanduser("~/.local/share/hqlab/boot-manifest.json")
+BOOT_MANIFEST_VERSION = 1
+
+# ============================================================================
+# Helper Functions
+# ============================================================================
+
+
+def write_file_atomic(path: str, content: str, mode: int = 0o600) -> bool:
+    """Atomically replace a file's content. Returns False if it was unchanged."""
+    try:
+        with open(path, "r") as f:
+            if f.read() == content:
+                return False
+    except FileNotFoundError:
+        pass
+
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, mode)
+    try:
+        with os.fdopen(fd, "w") as f:
+            f.write(content)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return True
+
+
+def secret_access_cmd(secret_name: str, gcp_project_id: str, version: str) -> list:
+    return [
+        "gcloud",
+        "secrets",
+        "versions",
+        "access",
+        version,
+        "--secret",
+        secret_name,
+        "--project",
+        gcp_project_id,
+        "--format",
+        "json",
+    ]
+
+
+def parse_secret_access(output: str):
+    """Return (secrets dict, version number) from `versions access --format json`."""
+    response = json.loads(output)
+    data = base64.b64decode(response["payload"]["data"]).decode()
+    return json.loads(data), response["name"].rsplit("/", 1)[-1]
+
+
+def access_secret_version(secret_name: str, gcp_project_id: str, version="latest"):
+    """Fetch a JSON secret from GCP Secret Manager with its version number."""
+    result = subprocess.run(
+        secret_access_cmd(secret_name, gcp_project_id, version),
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return parse_secret_access(result.stdout)
+
+
+def get_database_env(project_name: str, db_config: dict, superuser_password: str):
+    """Return the connection settings an app gets for x-config.database.
+
+    The password is derived from the superuser password, so every run (and
+    the boot-time secret fetch) arrives at the same one without storing it.
+    Apps connect to their PgBouncer, never to Postgres directly.
+    """
+    db_config = db_config if isinstance(db_config, dict) else {}
+    name = db_config.get("name", project_name)
+    user = db_config.get("user", project_name)
+    for value in (name, user):
+        if not re.fullmatch(r"[a-z_][a-z0-9_]*", value):
+            raise RuntimeError(f"Invalid database/role name: {value}")
+
+    password = hmac.new(
+        superuser_password.encode(), f"hqlab-db:{user}".encode(), hashlib.sha256
+    ).hexdigest()[:32]
+    host = f"{project_name}-pgbouncer"
+
+    return {
+        "POSTGRES_HOST": host,
+        "POSTGRES_PORT": "5432",
+        "POSTGRES_USER": user,
+        "POSTGRES_PASSWORD": password,
+        "POSTGRES_DB": name,
+        "DATABASE_URL": f"postgresql://{user}:{password}@{host}:5432/{name}",
+    }
+
+
+def write_secrets_dir(secrets_dir: str, secrets: dict):
+    """Write each secret to its own file in a tmpfs directory."""
+    os.makedirs(secrets_dir, mode=0o700, exist_ok=True)
+    for key, value in secrets.items():
+        write_file_atomic(os.path.join(secrets_dir, key), str(value))
+
+
+def activate_service_account(manifest: dict):
+    subprocess.run(
+        [
+            "gcloud",
+            "auth",
+            "activate-service-account",
+            "--key-file",
+            manifest["service_account_key"],
+        ],
+        check=True,
+        capture_output=True,
+    )
+
+
+# ============================================================================
+# Boot
+# ============================================================================
+
+
+def fetch_manifest_secrets(manifest: dict) -> bool:
+    """Fetch every project's pinned secret version into tmpfs.
+
+    All gcloud calls run at once. The gcloud credentials persist across
+    boots, so the service account is only re-activated if a fetch fails.
+    A pinned version that rotation has disabled or destroyed since the last
+    deploy falls back to `latest`.
+    """
+    gcp_project_id = manifest["gcp_project_id"]
+    projects = manifest["projects"]
+    versions = {name: project["version"] for name, project in projects.items()}
+
+    def start_all(names):
+        return {
+            name: subprocess.Popen(
+                secret_access_cmd(
+                    projects[name]["secret_name"], gcp_project_id, versions[name]
+                ),
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                text=True,
+            )
+            for name in names
+        }
+
+    fetched = {}
+    errors = {}
+    pending = list(projects)
+    activated = False
+    for _ in range(3):
+        errors = {}
+        for name, process in start_all(pending).items():
+            stdout, stderr = process.communicate()
+            if process.returncode == 0:
+                fetched[name], _ = parse_secret_access(stdout)
+            else:
+                errors[name] = stderr.strip()
+        pending = list(errors)
+
+        retry = False
+        needs_auth = False
+        for name in pending:
+            if versions[name] != "latest" and UNAVAILABLE_VERSION_ERRORS.search(
+                errors[name]
+            ):
+                print(
+                    f"⚠️  {name}: version {versions[name]} unavailable, "
+                    f"falling back to latest"
+                )
+                versions[name] = "latest"
+                retry = True
+            else:
+                needs_auth = True
+        if needs_auth and not activated:
+            activated = True
+            try:
+                activate_service_account(manifest)
+                retry = True
+            except (subprocess.CalledProcessError, OSError) as e:
+                print(f"⚠️  Could not activate service account: {e}")
+        if not retry:
+            break
+
+    for name, error in errors.items():
+        print(f"⚠️  {projects[name]['secret_name']}: {error}")
+
+    for name, secrets in fetched.items():
+        write_secrets_dir(projects[name]["secrets_dir"], secrets)
+        print(f"✅ {name}: {len(secrets)} secrets (version {versions[name]})")
+
+    # Database credentials are derived, never stored
+    shared = manifest.get("shared_postgres_project")
+    for name, database in manifest.get("databases", {}).items():
+        if "POSTGRES_PASSWORD" not in fetched.get(shared, {}):
+            print(f"⚠️  {name}: shared postgres secrets missing, database skipped")
+            pending.append(name)
+            continue
+        db_env = get_database_env(name, database, fetched[shared]["POSTGRES_PASSWORD"])
+        write_secrets_dir(database["secrets_dir"], db_env)
+        print(f"✅ {name}: database credentials")
+
+    return not pending
+
+
+def main() -> int:
+    try:
+        with open(BOOT_MANIFEST_FILE, "r") as f:
+            manifest = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        manifest = None
+
+    if not manifest or manifest.get("version") != BOOT_MANIFEST_VERSION:
+        # No deploy has written a manifest yet, take the slow path
+        print("No boot manifest, falling back to update_systemd.py")
+        script = os.path.join(
+            os.path.dirname(os.path.abspath(__file__)), "update_systemd.py"
+        )
+        os.execv(sys.executable, [sys.executable, script, "--fetch-secrets-only"])
+
+    return 0 if fetch_manifest_secrets(manifest) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
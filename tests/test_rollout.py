@@ -0,0 +1,114 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import update_systemd  # noqa: E402
+from update_systemd import FakeTransport, rollout, rollout_host  # noqa: E402
+
+# High enough that the fake's empty PSI output never holds a start back
+NO_PRESSURE = {"cpu": 100.0, "memory": 100.0, "io": 100.0}
+
+
+def make_project(hosts):
+    config = update_systemd.get_x_config({"x-config": {"hosts": hosts}})
+    return {"config": config, "services": [], "compose_data": {}}
+
+
+def project_calls(transport):
+    return [call for call in transport.calls if "update_systemd.py" in call[0]]
+
+
+def max_overlap(calls):
+    events = sorted(
+        [(start, 1) for _, start, _ in calls] + [(end, -1) for _, _, end in calls]
+    )
+    active = peak = 0
+    for _, change in events:
+        active += change
+        peak = max(peak, active)
+    return peak
+
+
+def test_rollout_runs_each_project_on_its_hosts():
+    projects = {
+        "kener": make_project(["nas"]),
+        "immich": make_project(["nas", "mini"]),
+        "pihole": make_project("mini"),
+    }
+    transports = {}
+
+    def factory(host):
+        transports[host] = FakeTransport(host)
+        return transports[host]
+
+    reports = rollout(
+        projects,
+        "/srv/compose",
+        thresholds=NO_PRESSURE,
+        child_args=["--project-id", "other-project"],
+        transport_factory=factory,
+    )
+
+    ran = sorted((report["host"], report["project"]) for report in reports)
+    assert ran == [
+        ("mini", "immich"),
+        ("mini", "pihole"),
+        ("nas", "immich"),
+        ("nas", "kener"),
+    ]
+    assert all(report["ok"] for report in reports)
+    for host, transport in transports.items():
+        for command, _, _ in project_calls(transport):
+            assert f"--host {host} " in command
+            assert "--project-id other-project" in command
+            assert command.endswith("--yes --project-id other-project")
+
+
+def test_rollout_reports_failures_next_to_successes():
+    projects = {
+        "kener": make_project(["nas"]),
+        "immich": make_project(["nas"]),
+        "pihole": make_project(["mini"]),
+    }
+
+    def factory(host):
+        if host == "mini":
+            return FakeTransport(host, connect_error="Connection refused")
+        return FakeTransport(host, responses={" immich ": (0, "  ❌ Error\n")})
+
+    reports = rollout(
+        projects, "/srv/compose", thresholds=NO_PRESSURE, transport_factory=factory
+    )
+
+    status = {(report["host"], report["project"]): report for report in reports}
+    assert status[("nas", "kener")]["ok"]
+    assert not status[("nas", "immich")]["ok"]
+    assert not status[("mini", "pihole")]["ok"]
+    assert "Connection refused" in status[("mini", "pihole")]["output"]
+
+
+def test_rollout_host_respects_the_per_host_limit(monkeypatch):
+    # Instant PSI reads, so only the project runs take time
+    monkeypatch.setattr(update_systemd, "read_pressure", lambda transport: {})
+    transport = FakeTransport("nas", delay=0.05)
+    names = [f"project{i}" for i in range(8)]
+
+    reports = rollout_host(
+        transport, names, "/srv/compose", max_parallel=2, thresholds=NO_PRESSURE
+    )
+
+    assert [report["project"] for report in reports] == names
+    assert len(project_calls(transport)) == 8
+    assert max_overlap(project_calls(transport)) == 2
+
+
+def test_rollout_host_dry_run_is_forwarded():
+    transport = FakeTransport("nas")
+
+    rollout_host(
+        transport, ["kener"], "/srv/compose", 1, dry_run=True, thresholds=NO_PRESSURE
+    )
+
+    (command,) = [command for command, _, _ in project_calls(transport)]
+    assert command.endswith("--dry-run")
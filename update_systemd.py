@@ -2,21 +2,64 @@
 # update_systemd.py
 
 import argparse
+import copy
+import fcntl
+import hashlib
+import ipaddress
 import json
+import math
 import os
+import re
+import shlex
 import shutil
 import subprocess
+import tempfile
+import threading
+import time
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime
 from pathlib import Path
 from typing import Dict, List, Optional, Tuple
 
 import yaml
 
+from boot_secrets import (
+    BOOT_MANIFEST_FILE,
+    BOOT_MANIFEST_VERSION,
+    access_secret_version,
+    get_database_env,
+    write_file_atomic,
+)
+
 # ============================================================================
 # GCP Configuration
 # ============================================================================
 GCP_PROJECT_ID = "homelab-462205"
 GCP_SERVICE_ACCOUNT_KEY = "/home/adhadse/.config/.gcp/homelab-462205-8d906c79fe59.json"
 COMPOSE_BASE_DIR = os.path.expanduser("~/podman_compose")
+# Relative to the base directory, mounted into traefik as /dynamic_configs
+TRAEFIK_DYNAMIC_CONFIG_DIR = "traefik/config/dynamic_configs"
+TRAEFIK_RELOAD_DELAY = 3  # providersThrottleDuration is 2s by default
+# Content-addressed snapshots of units and image IDs per project
+GENERATIONS_DIR = os.path.expanduser("~/.local/share/hqlab/generations")
+# Traefik access log (host side of the /var/log/traefik bind mount)
+TRAEFIK_ACCESS_LOG = "/var/log/traefik/access.log"
+ACCESS_LOG_STATE_FILE = os.path.expanduser("~/.local/share/hqlab/access-log-state.json")
+# Held while a run touches state shared by all projects on this host
+HOST_LOCK_FILE = os.path.expanduser("~/.local/share/hqlab/host.lock")
+# Project running Pi-hole, its x-config.local_dns_target is where hosts point
+PIHOLE_PROJECT = "pihole"
+PIHOLE_LOCAL_DNS_FILE = "05-hq-local-dns.conf"
+# Container of the restic project, already configured with the repository
+RESTIC_CONTAINER = "restic"
+# Project running the shared Postgres that x-config.database is provisioned on
+SHARED_POSTGRES_PROJECT = "postgres"
+SHARED_POSTGRES_SERVICE = "db"
+PGBOUNCER_IMAGE = "docker.io/edoburu/pgbouncer:latest"
+# PSI "some avg10" percentages above which starts are held back
+PRESSURE_THRESHOLDS = {"cpu": 80.0, "memory": 20.0, "io": 40.0}
 
 # ============================================================================
 # Helper Functions
@@ -73,6 +116,14 @@ def get_x_config(compose_data: dict) -> dict:
         "enable_gcp_integration": False,
         "secret_name": None,
         "config_name": None,
+        "reload": {},
+        "stateless": [],
+        "healthcheck_timeout": 120,
+        "local_dns_target": None,
+        "backup": {},
+        "hosts": ["local"],
+        "database": None,
+        "logging": {},
     }
 
     if not compose_data:
@@ -180,6 +231,16 @@ def list_projects(base_dir: str):
     print("=" * 80 + "\n")
 
 
+# Version of each secret written to tmpfs in this run, pinned in the boot manifest
+_fetched_secret_versions = {}
+
+
+def access_secret_json(secret_name: str, gcp_project_id: str) -> dict:
+    """Fetch the latest version of a JSON secret from GCP Secret Manager."""
+    secrets_json, _ = access_secret_version(secret_name, gcp_project_id)
+    return secrets_json
+
+
 def fetch_secrets_to_tmpfs(
     project_name: str,
     secret_name: str,
@@ -199,24 +260,7 @@ def fetch_secrets_to_tmpfs(
     secrets_json = {}
 
     try:
-        secrets_result = subprocess.run(
-            [
-                "gcloud",
-                "secrets",
-                "versions",
-                "access",
-                "latest",
-                "--secret",
-                secret_name,
-                "--project",
-                gcp_project_id,
-            ],
-            capture_output=True,
-            text=True,
-            check=True,
-        )
-
-        secrets_json = json.loads(secrets_result.stdout)
+        secrets_json, version = access_secret_version(secret_name, gcp_project_id)
 
         if show_secrets:
             print(f"  📋 Secrets fetched:")
@@ -241,6 +285,7 @@ def fetch_secrets_to_tmpfs(
                 f.write(str(value))
             os.chmod(secret_file, 0o600)
 
+        _fetched_secret_versions[secret_name] = version
         print(f"  ✅ {len(secrets_json)} secrets stored in tmpfs (RAM only)")
 
     except subprocess.CalledProcessError as e:
@@ -330,8 +375,6 @@ def update_compose_file_with_secrets(
         return compose_file
 
     # Make a deep copy to avoid modifying original
-    import copy
-
     compose_data = copy.deepcopy(compose_data)
 
     # Merge secrets and params (secrets take priority)
@@ -363,6 +406,10 @@ def update_compose_file_with_secrets(
     # Inject/overwrite combined variables as environment variables in services
     if combined_env_vars and "services" in compose_data:
         for service_name, service_config in compose_data["services"].items():
+            labels = get_service_labels(service_config)
+            if labels.get("hqlab.env-injection") == "false":
+                continue
+
             if "environment" not in service_config:
                 service_config["environment"] = {}
 
@@ -424,12 +471,23 @@ def get_container_name_for_service(service_name: str, compose_data: dict) -> str
     return container_name
 
 
-def generate_podlet(container_name: str, service_name: str):
+def get_logging_config(logging: dict, service_name: str) -> dict:
+    """Resolve x-config.logging for a service (per-service keys override)."""
+    logging = logging or {}
+    resolved = {k: v for k, v in logging.items() if not isinstance(v, dict)}
+    resolved.update(logging.get(service_name) or {})
+    return resolved
+
+
+def generate_podlet(
+    container_name: str, service_name: str, logging: Optional[dict] = None
+):
     """Generate the podlet file for a container.
 
     Args:
         container_name: The actual container name (e.g., 'postgres', 'pgadmin')
         service_name: The service name from compose file (e.g., 'db', 'pgadmin')
+        logging: x-config.logging, translated into log driver and rate limits
     """
     config_dir = os.path.expanduser("~/.config/containers/systemd/")
     os.chdir(config_dir)
@@ -440,7 +498,23 @@ def generate_podlet(container_name: str, service_name: str):
     podlet_cmd = f"podlet generate container {container_name} > {service_file}"
     subprocess.run(podlet_cmd, shell=True, check=True)
 
+    log_config = get_logging_config(logging, service_name)
+    if log_config:
+        # Replace whatever log settings the container was created with
+        with open(service_file, "r") as f:
+            lines = [
+                line for line in f if not line.startswith(("LogDriver=", "LogOpt="))
+            ]
+        with open(service_file, "w") as f:
+            f.writelines(lines)
+
     with open(service_file, "a") as f:
+        if log_config:
+            driver = log_config.get("driver", "journald")
+            f.write("\n[Container]\n")
+            f.write(f"LogDriver={driver}\n")
+            if driver == "k8s-file" and log_config.get("max_size"):
+                f.write(f"LogOpt=max-size={log_config['max_size']}\n")
         f.write("\n[Unit]\n")
         f.write("After=podman-secrets-loader.service\n")
         f.write("Requires=podman-secrets-loader.service\n")
@@ -448,13 +522,49 @@ def generate_podlet(container_name: str, service_name: str):
         f.write("StartLimitIntervalSec=200\n")
         f.write("\n[Service]\n")
         f.write("RestartSec=10s\n")
+        if log_config.get("rate_limit_interval"):
+            f.write(f"LogRateLimitIntervalSec={log_config['rate_limit_interval']}\n")
+        if log_config.get("rate_limit_burst"):
+            f.write(f"LogRateLimitBurst={log_config['rate_limit_burst']}\n")
         f.write("\n[Install]\n")
         f.write("WantedBy=default.target\n")
 
 
+_host_lock_depth = 0
+
+
+@contextmanager
+def host_lock():
+    """Serialise host-wide steps between concurrent runs on the same host.
+
+    `--rollout --host-parallel` runs several updates per host at once. They
+    share the Traefik and Pi-hole configs, the boot manifest, the access log
+    window, gcloud credentials and the systemd daemon. Re-entrant within one
+    process.
+    """
+    global _host_lock_depth
+    if _host_lock_depth:
+        _host_lock_depth += 1
+        try:
+            yield
+        finally:
+            _host_lock_depth -= 1
+        return
+
+    mkdir_p(os.path.dirname(HOST_LOCK_FILE))
+    with open(HOST_LOCK_FILE, "w") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        _host_lock_depth = 1
+        try:
+            yield
+        finally:
+            _host_lock_depth = 0
+
+
 def reload_systemd():
     """Reload the systemd manager configuration."""
-    subprocess.run("systemctl --user daemon-reload", shell=True, check=True)
+    with host_lock():
+        subprocess.run("systemctl --user daemon-reload", shell=True, check=True)
 
 
 def manage_project(
@@ -463,8 +573,14 @@ def manage_project(
     gcp_project_id: str,
     dry_run: bool = False,
     show_secrets: bool = False,
-) -> List[str]:
-    """Manage a single compose project."""
+    throttle: Optional["PressureThrottle"] = None,
+) -> Tuple[List[str], List[str]]:
+    """Manage a single compose project.
+
+    With a throttle, `compose up` waits for a slot, which is held until the
+    project's containers are healthy. Returns the services to start and the
+    ones whose update failed.
+    """
 
     config = project_info["config"]
     services = project_info["services"]
@@ -483,7 +599,7 @@ def manage_project(
 
     if dry_run:
         print("  [DRY RUN] Would start services")
-        return services
+        return services, []
 
     secrets_dir = None
     secrets_json = {}
@@ -502,6 +618,23 @@ def manage_project(
                 config_name, gcp_project_id, dry_run, show_secrets
             )
 
+    # Provision the app's role/database on the shared Postgres behind PgBouncer
+    if config["database"]:
+        try:
+            db_env, compose_data = provision_database(
+                project_name,
+                config["database"],
+                compose_data,
+                os.path.dirname(compose_dir),
+                gcp_project_id,
+            )
+        except (RuntimeError, subprocess.CalledProcessError) as e:
+            print(f"  ❌ Could not provision database: {e}")
+            return [], []
+        secrets_dir = write_database_secrets(project_name, db_env)
+        secrets_json = {**secrets_json, **db_env}
+        services = list(compose_data["services"].keys())
+
     # Update compose file with secrets path and parameters
     compose_file_to_use = compose_file
     if secrets_json or params:
@@ -516,9 +649,13 @@ def manage_project(
         )
         compose_file_to_use = temp_compose
 
+    # Stateless services that are already running get a blue-green update
+    blue_green_services = get_blue_green_services(services, config, compose_data)
+    regular_services = [s for s in services if s not in blue_green_services]
+
     # Stop running services
     print(f"  Stopping existing services...")
-    for service_name in services:
+    for service_name in regular_services:
         status_cmd = f"systemctl --user is-active {service_name}.service"
         is_active = (
             subprocess.run(
@@ -541,24 +678,16 @@ def manage_project(
             )
 
     # Check if any containers are running
-    any_running = False
-    for service_name in services:
-        container_name = get_container_name_for_service(service_name, compose_data)
-        if (
-            subprocess.run(
-                f"podman ps --format '{{{{.Names}}}}' | grep -w {container_name}",
-                shell=True,
-                stdout=subprocess.DEVNULL,
-                stderr=subprocess.DEVNULL,
-            ).returncode
-            == 0
-        ):
-            any_running = True
-            break
+    any_running = any(
+        is_container_running(get_container_name_for_service(s, compose_data))
+        for s in regular_services
+    )
 
     os.chdir(compose_dir)
 
-    if any_running:
+    # `compose down` would also take the blue-green services down, so in that
+    # case rely on --force-recreate to replace the regular services only
+    if any_running and not blue_green_services:
         print(f"  Running: podman compose down")
         subprocess.run(
             "podman compose down",
@@ -573,20 +702,53 @@ def manage_project(
     if compose_file_to_use != compose_file:
         compose_cmd += f" -f {compose_file_to_use}"
 
-    print(f"  Running: {compose_cmd} up -d --force-recreate")
-    result = subprocess.run(
-        f"{compose_cmd} up -d --force-recreate",
-        shell=True,
-        capture_output=True,
-        text=True,
-    )
+    if regular_services:
+        up_cmd = f"{compose_cmd} up -d --force-recreate"
+        if blue_green_services:
+            up_cmd += " " + " ".join(regular_services)
 
-    if result.returncode != 0:
-        print(f"  ❌ Error starting services:")
-        print(f"     {result.stderr}")
-        return []
+        if throttle:
+            throttle.acquire()
+        print(f"  Running: {up_cmd}")
+        result = subprocess.run(
+            up_cmd,
+            shell=True,
+            capture_output=True,
+            text=True,
+        )
+
+        if result.returncode != 0:
+            if throttle:
+                throttle.release()
+            print(f"  ❌ Error starting services:")
+            print(f"     {result.stderr}")
+            return [], []
+
+        if throttle:
+            release_when_healthy(
+                throttle,
+                [
+                    get_container_name_for_service(s, compose_data)
+                    for s in regular_services
+                ],
+                config["healthcheck_timeout"],
+            )
+
+        print(f"  ✅ Services started successfully")
 
-    print(f"  ✅ Services started successfully")
+    # Blue-green services are switched over one at a time, never all at once
+    failed = []
+    for service_name in blue_green_services:
+        if not blue_green_deploy(
+            project_name,
+            service_name,
+            compose_dir,
+            compose_file_to_use,
+            compose_data,
+            config["healthcheck_timeout"],
+            config["logging"],
+        ):
+            failed.append(service_name)
 
     # Clean up temp compose file
     if compose_file_to_use != compose_file:
@@ -598,8 +760,9 @@ def manage_project(
     # Generate systemd service files for each service
     print(f"  Generating systemd service files...")
     config_dir = os.path.expanduser("~/.config/containers/systemd/")
+    all_generated = True
 
-    for service_name in services:
+    for service_name in regular_services:
         try:
             # Get the actual container name (may differ from service name)
             container_name = get_container_name_for_service(service_name, compose_data)
@@ -607,12 +770,31 @@ def manage_project(
             print(
                 f"    Generating {service_name}.container (container: {container_name})"
             )
-            generate_podlet(container_name, service_name)
+            generate_podlet(container_name, service_name, config["logging"])
             print(f"    ✅ Generated {service_name}.container")
         except Exception as e:
+            all_generated = False
             print(f"    ⚠️  Could not generate {service_name}.container: {e}")
 
-    return services
+    # A failed switch-over leaves the old or the -bg container serving, the
+    # units on disk are not what runs, so they are not worth a generation
+    if all_generated and not failed:
+        record_generation(project_name, services, compose_data)
+
+    return [s for s in services if s not in failed], failed
+
+
+def is_container_running(container_name: str) -> bool:
+    """Check whether a container with exactly this name is running."""
+    return (
+        subprocess.run(
+            f"podman ps --format '{{{{.Names}}}}' | grep -x {container_name}",
+            shell=True,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        ).returncode
+        == 0
+    )
 
 
 def start_service(service_name: str):
@@ -680,16 +862,31 @@ def fetch_all_secrets(base_dir: str, gcp_project_id: str, service_account_key: s
         if secret_name:
             fetch_secrets_to_tmpfs(project_name, secret_name, gcp_project_id)
 
+    # The secrets directories were just recreated, restore the derived
+    # database credentials for apps on the shared Postgres
+    database_projects = {
+        name: info
+        for name, info in projects.items()
+        if info["config"]["enabled"] and info["config"]["database"]
+    }
+    if database_projects:
+        try:
+            superuser_password = get_shared_postgres_password(base_dir, gcp_project_id)
+        except (RuntimeError, subprocess.CalledProcessError) as e:
+            print(f"⚠️  Shared postgres secrets unavailable, databases skipped: {e}")
+            return
+        for project_name, project_info in database_projects.items():
+            db_env = get_database_env(
+                project_name, project_info["config"]["database"], superuser_password
+            )
+            write_database_secrets(project_name, db_env)
+
 
 def ensure_podman_secrets_service():
-    """Check if systemd service file exists, create it if not."""
+    """Create or update the systemd service file that loads secrets on boot."""
 
     service_path = Path.home() / ".config/systemd/user/podman-secrets-loader.service"
 
-    if service_path.exists():
-        print(f"Service file already exists at: {service_path}")
-        return
-
     # Create directory if it doesn't exist
     service_path.parent.mkdir(parents=True, exist_ok=True)
 
@@ -704,7 +901,7 @@ StartLimitIntervalSec=200
 
 [Service]
 Type=oneshot
-ExecStart=python3 /home/adhadse/podman_compose/update_systemd.py --fetch-secrets-only
+ExecStart=python3 -S /home/adhadse/podman_compose/boot_secrets.py
 RemainAfterExit=yes
 Restart=on-failure
 RestartSec=10s
@@ -715,195 +912,2480 @@ WantedBy=default.target
 """
 
     # Write the service file
-    service_path.write_text(service_content)
+    if not write_file_atomic(str(service_path), service_content, mode=0o644):
+        print(f"Service file already up to date at: {service_path}")
+        return
     print(
-        f"Load GCP secrets for Podman containers Service file created at: {service_path}"
+        f"Load GCP secrets for Podman containers Service file written at: {service_path}"
     )
 
 
-# ============================================================================
-# Main Function
-# ============================================================================
+def write_boot_manifest(
+    projects: Dict[str, dict], gcp_project_id: str, service_account_key: str
+):
+    """Precompile what the boot-time secret fetch needs into a JSON manifest.
 
+    boot_secrets.py reads only this file, so boot never imports PyYAML or
+    parses compose files. Secret versions written in this run are pinned,
+    so boot restores exactly the secrets the units were generated with;
+    projects not updated in this run keep their previously pinned version.
+    """
+    try:
+        with open(BOOT_MANIFEST_FILE, "r") as f:
+            previous = json.load(f).get("projects", {})
+    except (FileNotFoundError, json.JSONDecodeError):
+        previous = {}
+
+    manifest = {
+        "version": BOOT_MANIFEST_VERSION,
+        "gcp_project_id": gcp_project_id,
+        "service_account_key": service_account_key,
+        "shared_postgres_project": SHARED_POSTGRES_PROJECT,
+        "projects": {},
+        "databases": {},
+    }
 
-def main():
-    parser = argparse.ArgumentParser(
-        description="Manage Podman Compose projects with GCP secret integration",
-        formatter_class=argparse.RawDescriptionHelpFormatter,
-        epilog="""
-Examples:
-  # List all available projects
-  %(prog)s --list
+    for project_name, project_info in sorted(projects.items()):
+        config = project_info["config"]
+        if not config["enabled"]:
+            continue
+        secrets_dir = f"/dev/shm/podman-secrets-{project_name}"
 
-  # Start specific projects
-  %(prog)s kener postgres
+        secret_name = config["secret_name"]
+        if config["enable_gcp_integration"] and secret_name:
+            version = _fetched_secret_versions.get(secret_name)
+            if not version:
+                version = previous.get(project_name, {}).get("version", "latest")
+            manifest["projects"][project_name] = {
+                "secret_name": secret_name,
+                "version": version,
+                "secrets_dir": secrets_dir,
+            }
+
+        if config["database"]:
+            database = (
+                config["database"] if isinstance(config["database"], dict) else {}
+            )
+            manifest["databases"][project_name] = {
+                "name": database.get("name", project_name),
+                "user": database.get("user", project_name),
+                "secrets_dir": secrets_dir,
+            }
 
-  # Start all enabled projects
-  %(prog)s --all
+    os.makedirs(os.path.dirname(BOOT_MANIFEST_FILE), exist_ok=True)
+    if write_file_atomic(BOOT_MANIFEST_FILE, json.dumps(manifest, indent=2)):
+        print(f"📝 Boot manifest updated: {len(manifest['projects'])} project(s)")
 
-  # Use different GCP project
-  %(prog)s --all --project-id my-other-project
 
-  # Use different base directory
-  %(prog)s --all --base-dir ~/my-compose-files
+# ============================================================================
+# Blue-Green Deploys
+# ============================================================================
 
-  # Dry run (show what would happen)
-  %(prog)s --all --dry-run
 
-  # Clean up old secrets
-  %(prog)s --cleanup
-        """,
-    )
+def get_blue_green_services(
+    services: List[str], config: dict, compose_data: dict
+) -> List[str]:
+    """Return the stateless services (x-config.stateless) that are running.
 
-    parser.add_argument(
-        "projects", nargs="*", help="Names of the projects to manage (folder names)"
-    )
-    parser.add_argument(
-        "--all",
-        action="store_true",
-        help="Manage all enabled projects (x-config.enabled=true)",
-    )
-    parser.add_argument(
-        "--list",
-        action="store_true",
-        help="List all discovered projects and their configuration",
-    )
-    parser.add_argument(
-        "--project-id",
-        default=GCP_PROJECT_ID,
-        help=f"GCP Project ID (default: {GCP_PROJECT_ID})",
-    )
-    parser.add_argument(
-        "--base-dir",
-        default=COMPOSE_BASE_DIR,
-        help=f"Base directory for compose files (default: {COMPOSE_BASE_DIR})",
-    )
-    parser.add_argument(
-        "--dry-run",
-        action="store_true",
-        help="Show what would be done without doing it",
-    )
-    parser.add_argument(
-        "--show-secrets",
-        action="store_true",
-        help="Show fetched secrets and generated compose file (use with --dry-run)",
-    )
-    parser.add_argument(
-        "--cleanup", action="store_true", help="Clean up old secrets from tmpfs"
-    )
-    parser.add_argument(
-        "--fetch-secrets-only",
-        action="store_true",
-        help="Only fetch secrets without starting services (used by systemd on boot)",
-    )
-    parser.add_argument(
-        "--service-account-key",
-        default=GCP_SERVICE_ACCOUNT_KEY,
-        help=f"Path to GCP service account key (default: {GCP_SERVICE_ACCOUNT_KEY})",
-    )
+    Services that are not running yet have nothing to keep alive and go
+    through the regular down/up path. Without a healthcheck there is no way
+    to tell when the new container serves, and a copy of a service that
+    publishes host ports cannot bind them, so those are skipped as well.
+    """
+    stateless = config["stateless"]
+    if stateless is True:
+        stateless = services
 
-    args = parser.parse_args()
+    blue_green = []
+    for service_name in services:
+        if service_name not in (stateless or []):
+            continue
+        container_name = get_container_name_for_service(service_name, compose_data)
+        if not is_container_running(container_name):
+            continue
+        service_config = compose_data["services"][service_name]
+        if service_config.get("ports"):
+            print(f"  ⚠️  {service_name} publishes host ports, skipping blue-green")
+            continue
+        if not has_healthcheck(service_config, container_name):
+            print(f"  ⚠️  {service_name} has no healthcheck, skipping blue-green")
+            continue
+        blue_green.append(service_name)
+    return blue_green
 
-    ensure_podman_secrets_service()
 
-    # Handle cleanup
-    if args.cleanup:
-        print("Cleaning up old secrets from tmpfs...")
-        cleanup_old_secrets()
-        print("✅ Cleanup complete\n")
-        return
-    if args.fetch_secrets_only:
-        fetch_all_secrets(args.base_dir, args.project_id, args.service_account_key)
-        return
+def get_blue_green_containers(compose_data: dict) -> Dict[str, List[str]]:
+    """Return the `-bg` containers that serve in place of the canonical ones.
 
-    # Discover all projects
-    all_projects = discover_compose_projects(args.base_dir)
+    Usually there are none, unless an update is in progress or the canonical
+    container failed to come back and the `-bg` one was left serving.
+    """
+    stateless = get_x_config(compose_data)["stateless"]
+    services = list(compose_data.get("services", {}).keys())
+    if stateless is True:
+        stateless = services
 
-    # Handle list
-    if args.list:
-        list_projects(args.base_dir)
-        return
+    backends = {}
+    for service_name in services:
+        if service_name not in (stateless or []):
+            continue
+        container_name = get_container_name_for_service(service_name, compose_data)
+        if is_container_running(f"{container_name}-bg"):
+            backends[container_name] = [f"{container_name}-bg"]
+    return backends
 
-    # Determine which projects to manage
-    if args.all:
-        # Get all enabled projects
-        projects_to_manage = {
-            name: info
-            for name, info in all_projects.items()
-            if info["config"]["enabled"]
-        }
-        if not projects_to_manage:
-            print("No enabled projects found.")
-            print("Tip: Use --list to see all projects")
-            return
-    elif args.projects:
-        # Get specific projects
-        projects_to_manage = {}
-        for project_name in args.projects:
-            if project_name in all_projects:
-                if not all_projects[project_name]["config"]["enabled"]:
-                    print(
-                        f"⚠️  Warning: Project '{project_name}' is disabled (x-config.enabled=false)"
-                    )
-                    response = input(f"   Start it anyway? (y/N): ")
-                    if response.lower() != "y":
-                        continue
-                projects_to_manage[project_name] = all_projects[project_name]
-            else:
-                print(f"❌ Project not found: {project_name}")
-                print(f"   Available projects: {', '.join(all_projects.keys())}")
-    else:
-        parser.print_help()
-        print("\n💡 Tip: Use --list to see all available projects")
-        return
 
-    if not projects_to_manage:
-        print("No projects to manage.")
+def set_traefik_blue_green(
+    base_dir: str,
+    project_name: str,
+    compose_data: dict,
+    backends: Dict[str, List[str]],
+):
+    """Rewrite the project's file-provider routes to the given containers.
+
+    The generated `compose-<project>.yaml` lists servers explicitly and has
+    no health checks, so routes are pointed at the `-bg` container only while
+    the canonical one is recreated. Waits for Traefik to load the change.
+    Projects without a generated file are left alone.
+    """
+    path = os.path.join(
+        base_dir, TRAEFIK_DYNAMIC_CONFIG_DIR, f"compose-{project_name}.yaml"
+    )
+    if not os.path.exists(path):
         return
+    content = render_traefik_dynamic_config(project_name, compose_data, backends)
+    if content is not None and write_file_atomic(path, content, mode=0o644):
+        time.sleep(TRAEFIK_RELOAD_DELAY)
 
-    # Activate GCP service account
-    if not args.dry_run or args.show_secrets:
-        try:
-            activate_gcp_service_account(args.service_account_key, args.project_id)
-        except Exception as e:
-            print(f"❌ Failed to activate GCP service account: {e}")
-            return
-
-    # Create necessary directory
-    config_dir = os.path.expanduser("~/.config/containers/systemd/")
-    mkdir_p(config_dir)
 
-    # Manage each project
-    all_services = []
-    for project_name, project_info in projects_to_manage.items():
-        services = manage_project(
-            project_name, project_info, args.project_id, args.dry_run, args.show_secrets
-        )
-        all_services.extend(services)
+def has_healthcheck(service_config: dict, container_name: str) -> bool:
+    """Check for a healthcheck in the compose service or the running container."""
+    healthcheck = service_config.get("healthcheck") or {}
+    if healthcheck.get("disable") is True:
+        return False
+    if healthcheck.get("test"):
+        return True
 
-    if args.dry_run:
-        print("\n" + "=" * 80)
-        print("[DRY RUN] No changes made")
-        print("=" * 80 + "\n")
-        return
+    # Healthchecks defined by the image only show up on the container
+    result = subprocess.run(
+        [
+            "podman",
+            "inspect",
+            "--format",
+            "{{if .Config.Healthcheck}}yes{{end}}",
+            container_name,
+        ],
+        capture_output=True,
+        text=True,
+    )
+    return result.stdout.strip() == "yes"
 
-    # Reload systemd
-    print("\n" + "=" * 80)
-    print("Reloading systemd daemon...")
-    reload_systemd()
-    print("✅ Systemd reloaded")
 
-    # Start services
-    all_services = list(set(all_services))  # Remove duplicates
-    if all_services:
-        print(f"\nStarting {len(all_services)} service(s)...")
-        for service_name in all_services:
-            start_service(service_name)
+def wait_for_healthy(
+    container_name: str, timeout: int, require_healthcheck: bool = False
+) -> bool:
+    """Wait until a container reports healthy.
 
-    print("\nEnabling secrets loader service...")
-    subprocess.run(
-        "systemctl --user enable podman-secrets-loader.service",
-        shell=True,
+    A running container without a healthcheck counts as healthy unless
+    require_healthcheck is set.
+    """
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        result = subprocess.run(
+            [
+                "podman",
+                "inspect",
+                "--format",
+                "{{.State.Status}} {{if .State.Health}}{{.State.Health.Status}}{{end}}",
+                container_name,
+            ],
+            capture_output=True,
+            text=True,
+        )
+        state, _, health = result.stdout.strip().partition(" ")
+        if result.returncode == 0:
+            if state in ("exited", "dead") or health == "unhealthy":
+                return False
+            if state == "running" and (
+                health == "healthy" or (health == "" and not require_healthcheck)
+            ):
+                return True
+        time.sleep(2)
+    return False
+
+
+def blue_green_deploy(
+    project_name: str,
+    service_name: str,
+    compose_dir: str,
+    compose_file: str,
+    compose_data: dict,
+    timeout: int,
+    logging: Optional[dict] = None,
+) -> bool:
+    """Update a running stateless service without taking it offline.
+
+    A second container (`<name>-bg`) is started with the same Traefik labels.
+    Once it is healthy the generated file-provider routes point at it alone,
+    and the unit is regenerated and restarted under the canonical name. The
+    routes go back to the canonical container once it is healthy again, and
+    only then is the `-bg` one removed. If the `-bg` container fails the old
+    one keeps serving, if the canonical one fails the `-bg` one does.
+    """
+    container_name = get_container_name_for_service(service_name, compose_data)
+    bg_name = f"{container_name}-bg"
+    base_dir = os.path.dirname(compose_dir)
+
+    print(f"  🔵 Blue-green update: {service_name}")
+
+    with open(compose_file, "r") as f:
+        bg_data = yaml.safe_load(f)
+    bg_data["services"][service_name]["container_name"] = bg_name
+    bg_compose = os.path.join(compose_dir, f".{service_name}.bg.compose.yaml")
+    with open(bg_compose, "w") as f:
+        yaml.dump(bg_data, f, default_flow_style=False, sort_keys=False)
+
+    try:
+        os.chdir(compose_dir)
+        result = subprocess.run(
+            f"podman compose -f {bg_compose} up -d --no-deps --force-recreate "
+            f"{service_name}",
+            shell=True,
+            capture_output=True,
+            text=True,
+        )
+        if result.returncode != 0:
+            print(f"    ❌ Could not start {bg_name}: {result.stderr.strip()}")
+            return False
+
+        print(f"    Waiting for {bg_name} to become healthy...")
+        if not wait_for_healthy(bg_name, timeout, require_healthcheck=True):
+            print(f"    ❌ {bg_name} not healthy, keeping {container_name}")
+            subprocess.run(["podman", "rm", "-f", bg_name], capture_output=True)
+            return False
+
+        print(f"    🟢 {bg_name} healthy, moving routes to it")
+        set_traefik_blue_green(
+            base_dir, project_name, compose_data, {container_name: [bg_name]}
+        )
+
+        # Regenerate the unit from the new container under the canonical name
+        generate_podlet(bg_name, service_name, logging)
+        service_file = os.path.expanduser(
+            f"~/.config/containers/systemd/{service_name}.container"
+        )
+        with open(service_file, "r") as f:
+            content = f.read()
+        with open(service_file, "w") as f:
+            f.write(
+                content.replace(
+                    f"ContainerName={bg_name}\n", f"ContainerName={container_name}\n"
+                )
+            )
+        print(f"    ✅ Generated {service_name}.container")
+
+        reload_systemd()
+        subprocess.run(
+            f"systemctl --user restart {service_name}.service",
+            shell=True,
+            capture_output=True,
+        )
+        if not wait_for_healthy(container_name, timeout, require_healthcheck=True):
+            print(f"    ⚠️  {container_name} not healthy, leaving {bg_name} running")
+            return False
+
+        set_traefik_blue_green(base_dir, project_name, compose_data, {})
+        subprocess.run(["podman", "rm", "-f", bg_name], capture_output=True)
+        print(f"    ✅ Switched over, removed {bg_name}")
+        return True
+    finally:
+        if os.path.exists(bg_compose):
+            os.remove(bg_compose)
+
+
+# ============================================================================
+# Secret Rotation
+# ============================================================================
+
+
+def write_secret_in_place(path: str, content: str) -> bool:
+    """Rewrite a secret file keeping its inode. Returns False if unchanged.
+
+    podman-compose bind-mounts each `file:` secret on its own, which pins
+    the running container to the file's inode. Replacing the file (rename)
+    would leave the container reading the old secret, so existing files
+    are truncated and rewritten instead. Readers may briefly see a partial
+    file, which is why reload actions only run after all writes.
+    """
+    if not os.path.exists(path):
+        return write_file_atomic(path, content)
+
+    with open(path, "r+") as f:
+        if f.read() == content:
+            return False
+        f.seek(0)
+        f.truncate()
+        f.write(content)
+        f.flush()
+        os.fsync(f.fileno())
+    return True
+
+
+def get_service_secret_names(service_config: dict) -> List[str]:
+    """Return the names of file-based secrets mounted into a service."""
+    names = []
+    for entry in service_config.get("secrets", []) or []:
+        if isinstance(entry, dict):
+            names.append(entry.get("source"))
+        else:
+            names.append(entry)
+    return [name for name in names if name]
+
+
+def reload_service(service_name: str, container_name: str, action: dict) -> bool:
+    """Apply an x-config reload action to a running service.
+
+    Supported actions (tried in order, restart is the fallback):
+      {signal: HUP}             -> podman kill --signal HUP <container>
+      {exec: [cmd, arg, ...]}   -> podman exec <container> cmd arg ...
+    """
+    action = action or {}
+
+    if action.get("signal"):
+        cmd = ["podman", "kill", "--signal", str(action["signal"]), container_name]
+        label = f"signal {action['signal']}"
+    elif action.get("exec"):
+        exec_cmd = action["exec"]
+        if isinstance(exec_cmd, str):
+            exec_cmd = ["sh", "-c", exec_cmd]
+        cmd = ["podman", "exec", container_name, *exec_cmd]
+        label = "exec"
+    else:
+        cmd = None
+        label = "restart"
+
+    if cmd:
+        result = subprocess.run(cmd, capture_output=True, text=True)
+        if result.returncode == 0:
+            print(f"    🔄 Reloaded {service_name} ({label})")
+            return True
+        print(f"    ⚠️  {label} failed for {service_name}: {result.stderr.strip()}")
+        print(f"    Falling back to restart")
+
+    result = subprocess.run(
+        f"systemctl --user restart {service_name}.service",
+        shell=True,
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        print(f"    ❌ Could not restart {service_name}: {result.stderr.strip()}")
+        return False
+
+    print(f"    🔁 Restarted {service_name}")
+    return True
+
+
+def rotate_project_secrets(
+    project_name: str,
+    project_info: dict,
+    gcp_project_id: str,
+    dry_run: bool = False,
+) -> List[str]:
+    """Rewrite changed tmpfs secrets in place and reload only affected services.
+
+    Unlike manage_project(), containers are not recreated. Only file-based
+    secrets (compose `secrets:`) can be rotated this way; values injected as
+    environment variables are baked into the container and still need a full run.
+    """
+    config = project_info["config"]
+    compose_data = project_info["compose_data"]
+    secret_name = config["secret_name"]
+    secrets_dir = f"/dev/shm/podman-secrets-{project_name}"
+
+    print(f"\n🔐 Rotating secrets for project: {project_name}")
+
+    if not config["enable_gcp_integration"] or not secret_name:
+        print(f"  ⏭️  GCP integration not enabled, skipping")
+        return []
+
+    try:
+        secrets_json, version = access_secret_version(secret_name, gcp_project_id)
+    except subprocess.CalledProcessError as e:
+        print(f"  ⚠️  No secrets found: {secret_name}")
+        if e.stderr:
+            print(f"     Error: {e.stderr.strip()}")
+        return []
+
+    if not os.path.isdir(secrets_dir):
+        print(f"  ⚠️  {secrets_dir} does not exist, run a full update first")
+        return []
+
+    changed = []
+    for key, value in secrets_json.items():
+        secret_file = os.path.join(secrets_dir, key)
+        if dry_run:
+            try:
+                with open(secret_file, "r") as f:
+                    if f.read() == str(value):
+                        continue
+            except FileNotFoundError:
+                pass
+            changed.append(key)
+        elif write_secret_in_place(secret_file, str(value)):
+            changed.append(key)
+
+    if not dry_run:
+        _fetched_secret_versions[secret_name] = version
+
+    if not changed:
+        print(f"  ✅ Secrets unchanged")
+        return []
+
+    print(f"  📝 Changed: {', '.join(sorted(changed))}")
+
+    file_secrets = set(compose_data.get("secrets", {}) or {})
+    env_only = sorted(set(changed) - file_secrets)
+    if env_only:
+        print(f"  ⚠️  Injected as environment only: {', '.join(env_only)}")
+        print(f"     Run a full update to apply these to the containers")
+
+    reload_actions = config["reload"] or {}
+    affected = []
+    for service_name, service_config in compose_data.get("services", {}).items():
+        if set(get_service_secret_names(service_config)) & set(changed):
+            affected.append(service_name)
+
+    for service_name in affected:
+        container_name = get_container_name_for_service(service_name, compose_data)
+        if dry_run:
+            action = reload_actions.get(service_name) or {}
+            label = ", ".join(action.keys()) or "restart"
+            print(f"    [DRY RUN] Would reload {service_name} ({label})")
+            continue
+        reload_service(service_name, container_name, reload_actions.get(service_name))
+
+    return affected
+
+
+# ============================================================================
+# Traefik File Provider
+# ============================================================================
+
+# Label keys are case-insensitive, use the canonical spelling in the YAML
+TRAEFIK_KEY_NAMES = {
+    "loadbalancer": "loadBalancer",
+    "certresolver": "certResolver",
+    "entrypoints": "entryPoints",
+    "passhostheader": "passHostHeader",
+}
+TRAEFIK_LIST_KEYS = {"entryPoints", "middlewares"}
+
+
+def get_service_labels(service_config: dict) -> Dict[str, str]:
+    """Return a service's labels as a dict (compose allows list or mapping)."""
+    labels = service_config.get("labels", {}) or {}
+    if isinstance(labels, list):
+        labels = dict(item.split("=", 1) for item in labels if "=" in item)
+    # Compose escapes `$` as `$$` in labels
+    return {k: str(v).replace("$$", "$") for k, v in labels.items()}
+
+
+def parse_traefik_value(key: str, value: str):
+    """Convert a label value to the type the file provider expects."""
+    if key in TRAEFIK_LIST_KEYS:
+        return [item.strip() for item in value.split(",") if item.strip()]
+    if value.lower() in ("true", "false"):
+        return value.lower() == "true"
+    if value.isdigit():
+        return int(value)
+    return value
+
+
+def compile_traefik_labels(
+    project_name: str,
+    compose_data: dict,
+    backends: Optional[Dict[str, List[str]]] = None,
+) -> dict:
+    """Translate `traefik.*` labels of all services into a file-provider config.
+
+    `loadbalancer.server.port`/`.scheme` become an explicit server pointing at
+    the container name on the shared network, and routers without a `service`
+    are bound to the container's only service, as the Docker provider does.
+    `backends` maps a container name to the containers that serve its routes
+    instead, e.g. the `-bg` copy during a blue-green update.
+    """
+    backends = backends or {}
+    dynamic = {}
+
+    for service_name, service_config in compose_data.get("services", {}).items():
+        labels = get_service_labels(service_config)
+        if labels.get("traefik.enable", "false").lower() != "true":
+            continue
+
+        container_name = get_container_name_for_service(service_name, compose_data)
+        service_dynamic = {}
+
+        for label, value in labels.items():
+            parts = label.split(".")
+            if len(parts) < 4 or parts[0] != "traefik":
+                continue
+            if parts[1] not in ("http", "tcp", "udp"):
+                continue
+
+            parts = [TRAEFIK_KEY_NAMES.get(part.lower(), part) for part in parts[1:]]
+            node = service_dynamic
+            for part in parts[:-1]:
+                child = node.setdefault(part, {})
+                if not isinstance(child, dict):
+                    child = node[part] = {}
+                node = child
+            if isinstance(node.get(parts[-1]), dict):
+                # e.g. `traefik.http.routers.x=true`, not a real setting
+                continue
+            node[parts[-1]] = parse_traefik_value(parts[-1], value)
+
+        for protocol, sections in service_dynamic.items():
+            services = sections.get("services", {})
+            for lb_name, lb_config in services.items():
+                server = lb_config.get("loadBalancer", {}).pop("server", {})
+                if "port" not in server:
+                    continue
+                entries = []
+                for name in backends.get(container_name, [container_name]):
+                    if protocol == "http":
+                        scheme = server.get("scheme", "http")
+                        entries.append({"url": f"{scheme}://{name}:{server['port']}"})
+                    else:
+                        entries.append({"address": f"{name}:{server['port']}"})
+                lb_config["loadBalancer"]["servers"] = entries
+
+            for router_name, router in sections.get("routers", {}).items():
+                if isinstance(router.get("tls"), bool):
+                    router["tls"] = {} if router["tls"] else None
+                    if router["tls"] is None:
+                        del router["tls"]
+                if "service" not in router:
+                    if len(services) == 1:
+                        router["service"] = next(iter(services))
+                    else:
+                        print(
+                            f"  ⚠️  {project_name}: router {router_name} has no "
+                            f"service and none can be inferred"
+                        )
+
+            for section, entries in sections.items():
+                target = dynamic.setdefault(protocol, {}).setdefault(section, {})
+                target.update(entries)
+
+    return dynamic
+
+
+def render_traefik_dynamic_config(
+    project_name: str,
+    compose_data: dict,
+    backends: Optional[Dict[str, List[str]]] = None,
+) -> Optional[str]:
+    """Return the `compose-<project>.yaml` content, or None without routes."""
+    dynamic = compile_traefik_labels(project_name, compose_data, backends)
+    if not dynamic:
+        return None
+    return (
+        f"# Generated by update_systemd.py from the Traefik labels of "
+        f"{project_name}, do not edit\n"
+    ) + yaml.dump(dynamic, default_flow_style=False, sort_keys=True)
+
+
+def write_traefik_dynamic_configs(
+    base_dir: str, projects: Dict[str, dict], dry_run: bool = False
+) -> List[str]:
+    """Write one `compose-<project>.yaml` per project with Traefik routes.
+
+    Files are replaced atomically and only when their content changes, so
+    Traefik's file watcher does not reload for unchanged routes. Generated
+    files of projects that no longer declare routes are removed. Routes of a
+    service whose `-bg` container was left serving point at that container.
+
+    The Docker provider, if enabled, still builds its own `<name>@docker`
+    routers from the same labels. They share rules and priorities with the
+    `<name>@file` ones, so either may win; both point at the same containers.
+    """
+    config_dir = os.path.join(base_dir, TRAEFIK_DYNAMIC_CONFIG_DIR)
+    if not dry_run:
+        mkdir_p(config_dir)
+
+    written = []
+    expected = set()
+
+    for project_name, project_info in sorted(projects.items()):
+        compose_data = project_info["compose_data"]
+        content = render_traefik_dynamic_config(
+            project_name, compose_data, get_blue_green_containers(compose_data)
+        )
+        if content is None:
+            continue
+
+        filename = f"compose-{project_name}.yaml"
+        expected.add(filename)
+
+        path = os.path.join(config_dir, filename)
+        if dry_run:
+            print(f"  [DRY RUN] Would write {path}")
+            continue
+        if write_file_atomic(path, content, mode=0o644):
+            print(f"  📝 Updated {filename}")
+            written.append(path)
+
+    if not dry_run:
+        for filename in os.listdir(config_dir):
+            if filename.startswith("compose-") and filename not in expected:
+                os.remove(os.path.join(config_dir, filename))
+                print(f"  🗑️  Removed stale {filename}")
+
+    if not written:
+        print(f"  ✅ Traefik dynamic configs up to date")
+
+    return written
+
+
+# ============================================================================
+# Pi-hole Local DNS
+# ============================================================================
+
+
+def get_traefik_hosts(projects: Dict[str, dict]) -> List[str]:
+    """Collect every hostname from `Host()`/`HostSNI()` rules of Traefik routers."""
+    hosts = set()
+    for project_info in projects.values():
+        compose_data = project_info["compose_data"]
+        for service_config in compose_data.get("services", {}).values():
+            labels = get_service_labels(service_config)
+            if labels.get("traefik.enable", "false").lower() != "true":
+                continue
+            for label, value in labels.items():
+                if not re.match(r"traefik\.(http|tcp)\.routers\.[^.]+\.rule$", label):
+                    continue
+                for args in re.findall(r"Host(?:SNI)?\(([^)]*)\)", value):
+                    hosts.update(h for h in re.findall(r"`([^`]+)`", args) if h != "*")
+    return sorted(hosts)
+
+
+def render_pihole_local_dns(hosts: List[str], target: str) -> str:
+    """Render a dnsmasq config resolving all hosts to the Traefik host.
+
+    An IP target becomes `host-record` entries, a hostname becomes `cname`
+    entries (the target itself must resolve locally).
+    """
+    try:
+        ipaddress.ip_address(target)
+        is_ip = True
+    except ValueError:
+        is_ip = False
+    lines = ["# Generated by update_systemd.py from Traefik Host() rules, do not edit"]
+    for host in hosts:
+        if is_ip:
+            lines.append(f"host-record={host},{target}")
+        elif host != target:
+            lines.append(f"cname={host},{target}")
+    return "\n".join(lines) + "\n"
+
+
+def update_pihole_local_dns(
+    base_dir: str, projects: Dict[str, dict], dry_run: bool = False
+) -> bool:
+    """Sync Pi-hole's local DNS records and reload it when the hosts change.
+
+    Hosts come from every discovered project, including ones that are not
+    managed by this script (`enabled: false`) but still run behind Traefik.
+    The last applied file is kept next to the Pi-hole compose file to detect
+    changes, new content is copied into the container's /etc/dnsmasq.d and applied
+    with `pihole reloaddns`.
+    """
+    pihole_info = projects.get(PIHOLE_PROJECT)
+    if not pihole_info:
+        print(f"  ⏭️  No {PIHOLE_PROJECT} project, skipping local DNS")
+        return False
+
+    target = pihole_info["config"]["local_dns_target"]
+    if not target:
+        print(f"  ⏭️  {PIHOLE_PROJECT} has no x-config.local_dns_target, skipping")
+        return False
+
+    hosts = get_traefik_hosts(projects)
+    content = render_pihole_local_dns(hosts, target)
+    local_file = os.path.join(pihole_info["path"], PIHOLE_LOCAL_DNS_FILE)
+    container_file = f"/etc/dnsmasq.d/{PIHOLE_LOCAL_DNS_FILE}"
+    container_name = get_container_name_for_service(
+        pihole_info["services"][0], pihole_info["compose_data"]
+    )
+
+    if dry_run:
+        print(f"  [DRY RUN] Would point {len(hosts)} host(s) at {target}")
+        return False
+
+    try:
+        with open(local_file, "r") as f:
+            changed = f.read() != content
+    except FileNotFoundError:
+        changed = True
+
+    if not is_container_running(container_name):
+        print(f"  ⚠️  {container_name} is not running, records applied on next run")
+        return False
+
+    in_container = (
+        subprocess.run(
+            ["podman", "exec", container_name, "test", "-f", container_file],
+            capture_output=True,
+        ).returncode
+        == 0
+    )
+    if not changed and in_container:
+        print(f"  ✅ Local DNS up to date ({len(hosts)} hosts)")
+        return False
+
+    try:
+        # Write through a temp file so dnsmasq never reads a partial file
+        subprocess.run(
+            [
+                "podman",
+                "exec",
+                "-i",
+                container_name,
+                "sh",
+                "-c",
+                f"cat > {container_file}.tmp && mv {container_file}.tmp {container_file}",
+            ],
+            input=content,
+            text=True,
+            capture_output=True,
+            check=True,
+        )
+        subprocess.run(
+            ["podman", "exec", container_name, "pihole", "reloaddns"],
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+    except subprocess.CalledProcessError as e:
+        error = (e.stderr or "").strip() or e
+        print(f"  ⚠️  Could not update local DNS in {container_name}: {error}")
+        return False
+    # Recorded only once applied, so a failed reload is retried next run
+    write_file_atomic(local_file, content, mode=0o644)
+    print(f"  📝 Local DNS updated: {len(hosts)} host(s) -> {target}")
+    return True
+
+
+# ============================================================================
+# Database Backups
+# ============================================================================
+
+# Run at low CPU and best-effort/low IO priority where ionice is available
+LOW_PRIORITY_PREFIX = (
+    "exec $(command -v ionice >/dev/null && echo ionice -c2 -n7) nice -n 10"
+)
+
+
+def get_backup_jobs(projects: Dict[str, dict]) -> List[dict]:
+    """Build one dump job per service listed in x-config.backup."""
+    jobs = []
+    for project_name, project_info in sorted(projects.items()):
+        backup = project_info["config"]["backup"] or {}
+        for service_name, hint in backup.items():
+            hint = hint or {}
+            dump_type = hint.get("type", "pg_dumpall")
+            if dump_type not in ("pg_dump", "pg_dumpall"):
+                print(f"  ⚠️  {project_name}/{service_name}: unknown type {dump_type}")
+                continue
+            if dump_type == "pg_dump" and not hint.get("database"):
+                print(f"  ⚠️  {project_name}/{service_name}: pg_dump needs a database")
+                continue
+
+            user = hint.get("user", '"$POSTGRES_USER"')
+            dump_cmd = f"{dump_type} --username={user}"
+            if dump_type == "pg_dump":
+                dump_cmd += f" {hint['database']}"
+            else:
+                dump_cmd += " --clean --if-exists"
+
+            jobs.append(
+                {
+                    "name": f"{project_name}/{service_name}",
+                    "container": get_container_name_for_service(
+                        service_name, project_info["compose_data"]
+                    ),
+                    "dump_cmd": dump_cmd,
+                    "filename": f"{project_name}-{service_name}.sql",
+                    "project": project_name,
+                }
+            )
+    return jobs
+
+
+def run_backup_job(job: dict) -> dict:
+    """Stream one database dump into `restic backup --stdin`.
+
+    The dump's stdout is handed to restic as its stdin, so the data never
+    touches the disk or passes through Python. Bytes are taken from restic's
+    JSON summary. A snapshot of a failed dump is forgotten again.
+    """
+    report = {"name": job["name"], "ok": False, "bytes": 0, "seconds": 0.0}
+    start = time.monotonic()
+
+    # A pipe would fill up on a chatty dump and stall it while restic waits
+    dump_stderr = tempfile.TemporaryFile()
+    dump = subprocess.Popen(
+        [
+            "podman",
+            "exec",
+            job["container"],
+            "sh",
+            "-c",
+            f"{LOW_PRIORITY_PREFIX} {job['dump_cmd']}",
+        ],
+        stdout=subprocess.PIPE,
+        stderr=dump_stderr,
+    )
+    restic = subprocess.Popen(
+        [
+            "podman",
+            "exec",
+            "-i",
+            RESTIC_CONTAINER,
+            "sh",
+            "-c",
+            f"{LOW_PRIORITY_PREFIX} restic backup --json --stdin "
+            f"--stdin-filename {job['filename']} --tag db-dump --tag {job['project']}",
+        ],
+        stdin=dump.stdout,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        text=True,
+    )
+    # Only restic holds the read end now, so it sees EOF when the dump ends
+    dump.stdout.close()
+
+    restic_out, restic_err = restic.communicate()
+    dump.wait()
+    with dump_stderr:
+        dump_stderr.seek(0)
+        dump_err = dump_stderr.read().decode(errors="replace")
+    report["seconds"] = time.monotonic() - start
+
+    summary = {}
+    for line in restic_out.splitlines():
+        try:
+            message = json.loads(line)
+        except json.JSONDecodeError:
+            continue
+        if message.get("message_type") == "summary":
+            summary = message
+
+    report["bytes"] = summary.get("total_bytes_processed", 0)
+    report["snapshot"] = summary.get("snapshot_id", "")
+
+    if dump.returncode != 0:
+        report["error"] = dump_err.strip() or f"dump exited {dump.returncode}"
+        if report["snapshot"]:
+            subprocess.run(
+                [
+                    "podman",
+                    "exec",
+                    RESTIC_CONTAINER,
+                    "restic",
+                    "forget",
+                    report["snapshot"],
+                ],
+                capture_output=True,
+            )
+    elif restic.returncode != 0:
+        report["error"] = restic_err.strip() or f"restic exited {restic.returncode}"
+    else:
+        report["ok"] = True
+
+    return report
+
+
+def backup_databases(
+    projects: Dict[str, dict], max_parallel: int = 2, dry_run: bool = False
+) -> List[dict]:
+    """Dump all databases from x-config.backup hints into restic in parallel."""
+    jobs = get_backup_jobs(projects)
+    if not jobs:
+        print("No x-config.backup hints found.")
+        return []
+
+    if dry_run:
+        for job in jobs:
+            print(f"  [DRY RUN] {job['container']}: {job['dump_cmd']} | restic")
+        return []
+
+    if not is_container_running(RESTIC_CONTAINER):
+        print(f"❌ {RESTIC_CONTAINER} container is not running")
+        return []
+
+    runnable = []
+    for job in jobs:
+        if is_container_running(job["container"]):
+            runnable.append(job)
+        else:
+            print(f"  ⏭️  {job['name']}: {job['container']} is not running")
+
+    print(f"Backing up {len(runnable)} database(s), {max_parallel} at a time...")
+    with ThreadPoolExecutor(max_workers=max(1, max_parallel)) as executor:
+        reports = list(executor.map(run_backup_job, runnable))
+
+    print("\n" + "=" * 80)
+    print(f"{'DATABASE':<30} {'SIZE':>10} {'TIME':>8} {'RATE':>11}  SNAPSHOT")
+    print("-" * 80)
+    for report in reports:
+        size_mb = report["bytes"] / 1024 / 1024
+        rate = size_mb / report["seconds"] if report["seconds"] else 0
+        status = report.get("snapshot", "")[:8] if report["ok"] else "❌ FAILED"
+        print(
+            f"{report['name']:<30} {size_mb:>8.1f}MB {report['seconds']:>7.1f}s "
+            f"{rate:>7.1f}MB/s  {status}"
+        )
+        if not report["ok"]:
+            print(f"    {report['error']}")
+    print("=" * 80 + "\n")
+
+    return reports
+
+
+# ============================================================================
+# Multi-Host Rollout
+# ============================================================================
+
+
+class Transport(ABC):
+    """Runs shell commands on one host."""
+
+    name = "local"
+
+    def connect(self):
+        """Prepare the connection before commands run concurrently."""
+
+    def close(self):
+        """Release the connection."""
+
+    @abstractmethod
+    def run(self, command: str) -> subprocess.CompletedProcess:
+        """Run a shell command and capture its output."""
+
+
+class LocalTransport(Transport):
+    """Runs commands on this machine."""
+
+    def run(self, command: str) -> subprocess.CompletedProcess:
+        return subprocess.run(
+            command,
+            shell=True,
+            capture_output=True,
+            text=True,
+            stdin=subprocess.DEVNULL,
+        )
+
+
+class SSHTransport(Transport):
+    """Runs commands over a single multiplexed SSH connection per host."""
+
+    def __init__(self, destination: str):
+        self.name = destination
+        self.control_path = os.path.expanduser("~/.ssh/hqlab-%C")
+
+    def _ssh(self, *args: str) -> List[str]:
+        return [
+            "ssh",
+            "-o",
+            "BatchMode=yes",
+            "-o",
+            "ControlMaster=auto",
+            "-o",
+            f"ControlPath={self.control_path}",
+            "-o",
+            "ControlPersist=120",
+            *args,
+        ]
+
+    def connect(self):
+        # Open the master up front, concurrent first connections would race
+        subprocess.run(
+            self._ssh(self.name, "true"), check=True, capture_output=True, text=True
+        )
+
+    def close(self):
+        subprocess.run(self._ssh("-O", "exit", self.name), capture_output=True)
+
+    def run(self, command: str) -> subprocess.CompletedProcess:
+        return subprocess.run(
+            self._ssh(self.name, command),
+            capture_output=True,
+            text=True,
+            stdin=subprocess.DEVNULL,
+        )
+
+
+class FakeTransport(Transport):
+    """In-process transport for tests, records commands and replays results.
+
+    `responses` maps a substring of the command to (returncode, stdout).
+    Each command takes `delay` seconds and is recorded in `calls` with its
+    start and end time, so tests can tell which commands overlapped.
+    """
+
+    def __init__(
+        self,
+        name: str = "fake",
+        responses: Optional[dict] = None,
+        connect_error: Optional[str] = None,
+        delay: float = 0.0,
+    ):
+        self.name = name
+        self.responses = responses or {}
+        self.connect_error = connect_error
+        self.delay = delay
+        self.commands = []
+        self.calls = []
+
+    def connect(self):
+        if self.connect_error:
+            raise subprocess.CalledProcessError(255, "ssh", stderr=self.connect_error)
+
+    def run(self, command: str) -> subprocess.CompletedProcess:
+        self.commands.append(command)
+        start = time.monotonic()
+        time.sleep(self.delay)
+        self.calls.append((command, start, time.monotonic()))
+        for pattern, (returncode, stdout) in self.responses.items():
+            if pattern in command:
+                return subprocess.CompletedProcess(command, returncode, stdout, "")
+        return subprocess.CompletedProcess(command, 0, "", "")
+
+
+def get_transport(host: str) -> Transport:
+    """Return the transport for an x-config.hosts entry."""
+    if host in ("local", "localhost"):
+        return LocalTransport()
+    return SSHTransport(host)
+
+
+def get_project_hosts(project_info: dict) -> List[str]:
+    """Return the hosts a project is placed on (x-config.hosts)."""
+    hosts = project_info["config"]["hosts"] or ["local"]
+    if isinstance(hosts, str):
+        hosts = [hosts]
+    return ["local" if host == "localhost" else host for host in hosts]
+
+
+def is_placed_on(project_info: dict, host: str) -> bool:
+    """Check whether a project runs on the given host ("local" for this one)."""
+    return ("local" if host == "localhost" else host) in get_project_hosts(project_info)
+
+
+def get_rollout_plan(projects: Dict[str, dict]) -> Dict[str, List[str]]:
+    """Group projects by the hosts they are placed on (x-config.hosts)."""
+    plan = {}
+    for project_name, project_info in sorted(projects.items()):
+        for host in get_project_hosts(project_info):
+            plan.setdefault(host, []).append(project_name)
+    return plan
+
+
+def rollout_host(
+    transport: Transport,
+    project_names: List[str],
+    base_dir: str,
+    max_parallel: int,
+    dry_run: bool = False,
+    thresholds: Optional[Dict[str, float]] = None,
+    child_args: Optional[List[str]] = None,
+) -> List[dict]:
+    """Run update_systemd.py for each project on one host.
+
+    The compose tree is expected at the same base directory on every host,
+    and each host fetches its own secrets. Projects were already confirmed
+    by the caller, hence `--yes`; `child_args` carries the caller's other
+    options. Up to max_parallel projects run at once, fewer while the host
+    is under pressure. The runs take turns on host-wide steps through
+    `host_lock()`.
+    """
+    script = os.path.join(base_dir, "update_systemd.py")
+    throttle = PressureThrottle(max_parallel, thresholds, transport)
+
+    def run_project(project_name: str) -> dict:
+        command = (
+            f"python3 {shlex.quote(script)} --base-dir {shlex.quote(base_dir)} "
+            f"--host {shlex.quote(transport.name)} {shlex.quote(project_name)} --yes"
+        )
+        for arg in child_args or []:
+            command += f" {shlex.quote(arg)}"
+        if dry_run:
+            command += " --dry-run"
+        start = time.monotonic()
+        throttle.acquire()
+        try:
+            result = transport.run(command)
+        finally:
+            throttle.release()
+        return {
+            "host": transport.name,
+            "project": project_name,
+            "ok": result.returncode == 0 and "❌" not in result.stdout,
+            "seconds": time.monotonic() - start,
+            "output": (result.stdout + result.stderr).strip(),
+        }
+
+    try:
+        transport.connect()
+    except (subprocess.CalledProcessError, OSError) as e:
+        error = getattr(e, "stderr", None) or str(e)
+        return [
+            {
+                "host": transport.name,
+                "project": project_name,
+                "ok": False,
+                "seconds": 0.0,
+                "output": f"Could not connect: {error.strip()}",
+            }
+            for project_name in project_names
+        ]
+
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, max_parallel)) as executor:
+            return list(executor.map(run_project, project_names))
+    finally:
+        transport.close()
+
+
+def rollout(
+    projects: Dict[str, dict],
+    base_dir: str,
+    max_parallel_per_host: int = 1,
+    dry_run: bool = False,
+    thresholds: Optional[Dict[str, float]] = None,
+    child_args: Optional[List[str]] = None,
+    transport_factory=get_transport,
+) -> List[dict]:
+    """Roll out projects to all their hosts concurrently and print one report."""
+    plan = get_rollout_plan(projects)
+
+    print(f"Rolling out to {len(plan)} host(s)...")
+    for host, project_names in plan.items():
+        print(f"  {host}: {', '.join(project_names)}")
+
+    with ThreadPoolExecutor(max_workers=max(1, len(plan))) as executor:
+        futures = [
+            executor.submit(
+                rollout_host,
+                transport_factory(host),
+                project_names,
+                base_dir,
+                max_parallel_per_host,
+                dry_run,
+                thresholds,
+                child_args,
+            )
+            for host, project_names in plan.items()
+        ]
+        reports = [report for future in futures for report in future.result()]
+
+    print("\n" + "=" * 80)
+    print(f"{'HOST':<24} {'PROJECT':<24} {'TIME':>8}  STATUS")
+    print("-" * 80)
+    for report in reports:
+        status = "✅" if report["ok"] else "❌ FAILED"
+        print(
+            f"{report['host']:<24} {report['project']:<24} "
+            f"{report['seconds']:>7.1f}s  {status}"
+        )
+        if not report["ok"]:
+            for line in report["output"].splitlines()[-5:]:
+                print(f"    {line}")
+    print("-" * 80)
+    failed = sum(1 for report in reports if not report["ok"])
+    print(f"Total: {len(reports) - failed} succeeded, {failed} failed")
+    print("=" * 80 + "\n")
+
+    return reports
+
+
+# ============================================================================
+# Pressure-Aware Throttling
+# ============================================================================
+
+
+def parse_pressure_thresholds(value: str) -> Dict[str, float]:
+    """Parse `cpu=80,memory=20,io=40` into thresholds (missing keys keep defaults)."""
+    thresholds = dict(PRESSURE_THRESHOLDS)
+    for item in value.split(","):
+        if not item.strip():
+            continue
+        resource, _, limit = item.partition("=")
+        if resource.strip() not in PRESSURE_THRESHOLDS:
+            raise argparse.ArgumentTypeError(f"Unknown pressure resource: {resource}")
+        thresholds[resource.strip()] = float(limit)
+    return thresholds
+
+
+def read_pressure(transport: Transport) -> Dict[str, float]:
+    """Read PSI "some avg10" for cpu, memory and io on a host.
+
+    Both the system-wide /proc/pressure files and the user manager's cgroup
+    (where the rootless containers run) are read, the higher value wins.
+    Hosts without PSI report no pressure.
+    """
+    paths = " ".join(
+        f"/proc/pressure/{resource} "
+        f"/sys/fs/cgroup/user.slice/user-$uid.slice/user@$uid.service/"
+        f"{resource}.pressure"
+        for resource in PRESSURE_THRESHOLDS
+    )
+    result = transport.run(f"uid=$(id -u); grep -H '^some' {paths} 2>/dev/null")
+
+    pressure = {resource: 0.0 for resource in PRESSURE_THRESHOLDS}
+    for line in result.stdout.splitlines():
+        path, _, values = line.partition(":")
+        resource = os.path.basename(path).replace(".pressure", "")
+        match = re.search(r"avg10=([\d.]+)", values)
+        if resource in pressure and match:
+            pressure[resource] = max(pressure[resource], float(match.group(1)))
+    return pressure
+
+
+class PressureThrottle:
+    """Adaptive concurrency limit for starts, driven by PSI.
+
+    Starts at one slot. Every start that finishes while pressure is below the
+    thresholds adds a slot (up to max_limit). Pressure above a threshold halves
+    the limit and holds new starts until it drops. If pressure stays high with
+    nothing in flight, one start goes ahead after max_wait seconds anyway.
+    """
+
+    def __init__(
+        self,
+        max_limit: int,
+        thresholds: Optional[Dict[str, float]] = None,
+        transport: Optional[Transport] = None,
+        poll_interval: float = 2.0,
+        max_wait: float = 60.0,
+    ):
+        self.max_limit = max(1, max_limit)
+        self.thresholds = thresholds or PRESSURE_THRESHOLDS
+        self.transport = transport or LocalTransport()
+        self.poll_interval = poll_interval
+        self.max_wait = max_wait
+        self.limit = 1
+        self.active = 0
+        self.condition = threading.Condition()
+
+    def over_thresholds(self) -> List[str]:
+        pressure = read_pressure(self.transport)
+        return [
+            f"{resource} {pressure[resource]:.1f}% > {limit:.0f}%"
+            for resource, limit in self.thresholds.items()
+            if pressure.get(resource, 0.0) > limit
+        ]
+
+    def acquire(self):
+        # PSI is read outside the lock, over SSH it takes a round trip
+        start = time.monotonic()
+        warned = False
+        while True:
+            with self.condition:
+                while self.active >= self.limit:
+                    self.condition.wait(self.poll_interval)
+            over = self.over_thresholds()
+            waited = time.monotonic() - start
+            with self.condition:
+                if self.active >= self.limit:
+                    continue
+                if not over or (self.active == 0 and waited >= self.max_wait):
+                    self.active += 1
+                    return
+                if self.limit > 1 or not warned:
+                    self.limit = max(1, self.limit // 2)
+                    warned = True
+                    print(
+                        f"  ⏳ Pressure high ({', '.join(over)}), "
+                        f"limit {self.limit}"
+                    )
+                self.condition.wait(self.poll_interval)
+
+    def wait_idle(self):
+        """Wait until every slot has been released."""
+        with self.condition:
+            while self.active:
+                self.condition.wait(self.poll_interval)
+
+    def release(self):
+        with self.condition:
+            self.active -= 1
+            self.condition.notify_all()
+        over = self.over_thresholds()
+        with self.condition:
+            if self.limit < self.max_limit and not over:
+                self.limit += 1
+                self.condition.notify_all()
+
+
+def release_when_healthy(
+    throttle: PressureThrottle, containers: List[str], timeout: int
+) -> threading.Thread:
+    """Hold a throttle slot in the background until the containers are healthy.
+
+    Lets the caller move on to the next project while the slot still counts
+    against the limit for as long as these containers are coming up.
+    """
+
+    def wait():
+        deadline = time.monotonic() + timeout
+        try:
+            for container_name in containers:
+                wait_for_healthy(container_name, max(0, deadline - time.monotonic()))
+        finally:
+            throttle.release()
+
+    thread = threading.Thread(target=wait, daemon=True)
+    thread.start()
+    return thread
+
+
+def start_services(
+    services: Dict[str, Tuple[str, int]], throttle: PressureThrottle
+) -> Dict[str, bool]:
+    """Start units as fast as system pressure allows.
+
+    `services` maps unit name to (container name, healthcheck timeout). A
+    slot is held until the container is healthy, so the limit reflects the
+    cost of bringing a service up, not just of forking it.
+    """
+
+    def start(service_name: str) -> bool:
+        container_name, timeout = services[service_name]
+        throttle.acquire()
+        try:
+            start_service(service_name)
+            return wait_for_healthy(container_name, timeout)
+        finally:
+            throttle.release()
+
+    with ThreadPoolExecutor(max_workers=max(1, throttle.max_limit)) as executor:
+        results = dict(zip(services, executor.map(start, services)))
+
+    for service_name, healthy in results.items():
+        if not healthy:
+            print(f"  ⚠️  {service_name} did not become healthy")
+    return results
+
+
+# ============================================================================
+# Shared Postgres
+# ============================================================================
+
+
+def get_shared_postgres_password(base_dir: str, gcp_project_id: str) -> str:
+    """Fetch the shared Postgres superuser password from its project's secrets."""
+    compose_data, _ = get_compose_data(os.path.join(base_dir, SHARED_POSTGRES_PROJECT))
+    if not compose_data:
+        raise RuntimeError(f"{SHARED_POSTGRES_PROJECT} project not found")
+
+    secret_name = get_x_config(compose_data)["secret_name"]
+    secrets_json = access_secret_json(secret_name, gcp_project_id)
+    if "POSTGRES_PASSWORD" not in secrets_json:
+        raise RuntimeError(f"POSTGRES_PASSWORD missing from {secret_name}")
+    return secrets_json["POSTGRES_PASSWORD"]
+
+
+def write_database_secrets(project_name: str, db_env: Dict[str, str]) -> str:
+    """Store the database credentials in the project's tmpfs secrets."""
+    secrets_dir = f"/dev/shm/podman-secrets-{project_name}"
+    os.makedirs(secrets_dir, mode=0o700, exist_ok=True)
+    for key, value in db_env.items():
+        write_file_atomic(os.path.join(secrets_dir, key), value)
+    return secrets_dir
+
+
+def provision_database(
+    project_name: str,
+    db_config: dict,
+    compose_data: dict,
+    base_dir: str,
+    gcp_project_id: str,
+) -> Tuple[Dict[str, str], dict]:
+    """Create the app's role and database on the shared Postgres if missing.
+
+    Safe to rerun: the role's password is reset to the same derived value
+    and existing databases are left alone. Returns the app's connection
+    settings and a copy of the compose data with a PgBouncer service
+    (transaction pooling) added in front of the shared instance. Apps that
+    rely on session state (advisory locks, LISTEN, SET) should use
+    `pool_mode: session` instead.
+    """
+    db_config = db_config if isinstance(db_config, dict) else {}
+    superuser_password = get_shared_postgres_password(base_dir, gcp_project_id)
+    db_env = get_database_env(project_name, db_config, superuser_password)
+    user, name = db_env["POSTGRES_USER"], db_env["POSTGRES_DB"]
+
+    postgres_data, _ = get_compose_data(os.path.join(base_dir, SHARED_POSTGRES_PROJECT))
+    postgres_container = get_container_name_for_service(
+        SHARED_POSTGRES_SERVICE, postgres_data
+    )
+    if not is_container_running(postgres_container):
+        raise RuntimeError(f"{postgres_container} is not running")
+
+    print(f"  🐘 Provisioning database {name} (role {user}) on {postgres_container}")
+
+    # Passed on stdin so the password never shows up in a process list
+    sql = f"""\\set role {user}
+\\set db {name}
+\\set password '{db_env["POSTGRES_PASSWORD"]}'
+SELECT format('CREATE ROLE %I LOGIN', :'role')
+WHERE NOT EXISTS (SELECT FROM pg_roles WHERE rolname = :'role')\\gexec
+ALTER ROLE :"role" WITH LOGIN PASSWORD :'password';
+SELECT format('CREATE DATABASE %I OWNER %I', :'db', :'role')
+WHERE NOT EXISTS (SELECT FROM pg_database WHERE datname = :'db')\\gexec
+"""
+    subprocess.run(
+        [
+            "podman",
+            "exec",
+            "-i",
+            postgres_container,
+            "sh",
+            "-c",
+            'psql -q -v ON_ERROR_STOP=1 -U "$POSTGRES_USER" -d postgres',
+        ],
+        input=sql,
+        text=True,
+        capture_output=True,
+        check=True,
+    )
+
+    compose_data = copy.deepcopy(compose_data)
+    pgbouncer = db_env["POSTGRES_HOST"]
+    compose_data["services"][pgbouncer] = {
+        "image": PGBOUNCER_IMAGE,
+        "container_name": pgbouncer,
+        "restart": "always",
+        "environment": {
+            "DB_HOST": postgres_container,
+            "DB_PORT": "5432",
+            "DB_USER": user,
+            "DB_PASSWORD": db_env["POSTGRES_PASSWORD"],
+            "DB_NAME": name,
+            "AUTH_TYPE": "scram-sha-256",
+            "POOL_MODE": db_config.get("pool_mode", "transaction"),
+            "DEFAULT_POOL_SIZE": str(db_config.get("pool_size", 10)),
+            "MAX_CLIENT_CONN": str(db_config.get("max_client_conn", 100)),
+        },
+        # DATABASE_URL injected into the app would repoint PgBouncer at itself
+        "labels": ["hqlab.env-injection=false"],
+        "networks": ["traefik_net"],
+    }
+    for service_name, service_config in compose_data["services"].items():
+        if service_name != pgbouncer:
+            service_config.setdefault("depends_on", [])
+            if isinstance(service_config["depends_on"], list):
+                service_config["depends_on"].append(pgbouncer)
+    compose_data.setdefault("networks", {}).setdefault(
+        "traefik_net", {"external": True}
+    )
+
+    print(f"  ✅ Database ready, app connects through {pgbouncer}")
+    return db_env, compose_data
+
+
+# ============================================================================
+# Generation Store
+# ============================================================================
+
+
+def store_blob(content: str) -> str:
+    """Store content once under its sha256 and return the hash."""
+    digest = hashlib.sha256(content.encode()).hexdigest()
+    objects_dir = os.path.join(GENERATIONS_DIR, "objects")
+    os.makedirs(objects_dir, mode=0o700, exist_ok=True)
+    path = os.path.join(objects_dir, digest)
+    if not os.path.exists(path):
+        write_file_atomic(path, content)
+    return digest
+
+
+def load_blob(digest: str) -> str:
+    with open(os.path.join(GENERATIONS_DIR, "objects", digest), "r") as f:
+        return f.read()
+
+
+def list_generations(project_name: str) -> List[dict]:
+    """Return the project's generation manifests, oldest first."""
+    project_dir = os.path.join(GENERATIONS_DIR, project_name)
+    if not os.path.isdir(project_dir):
+        return []
+
+    generations = []
+    for filename in os.listdir(project_dir):
+        if filename.endswith(".json"):
+            with open(os.path.join(project_dir, filename), "r") as f:
+                generations.append(json.load(f))
+    return sorted(generations, key=lambda g: g["generation"])
+
+
+def get_active_generation(project_name: str) -> Optional[int]:
+    """Return the generation the project's units were last set to."""
+    try:
+        with open(os.path.join(GENERATIONS_DIR, project_name, "active"), "r") as f:
+            return int(f.read().strip())
+    except (FileNotFoundError, ValueError):
+        # Stores from before the pointer existed: the latest one is active
+        generations = list_generations(project_name)
+        return generations[-1]["generation"] if generations else None
+
+
+def set_active_generation(project_name: str, number: int):
+    write_file_atomic(
+        os.path.join(GENERATIONS_DIR, project_name, "active"), f"{number}\n"
+    )
+
+
+def record_generation(
+    project_name: str, services: List[str], compose_data: dict
+) -> Optional[int]:
+    """Snapshot the project's units and image IDs and mark them active.
+
+    Contents are stored once by hash, so a generation costs only a small
+    manifest. A run that matches an earlier generation (e.g. redeploying
+    after a rollback) reuses it. Units can hold secrets, so everything is
+    kept owner-only. Rendered compose files are not kept, rollback only
+    needs the units.
+    """
+    config_dir = os.path.expanduser("~/.config/containers/systemd/")
+
+    units = {}
+    images = {}
+    for service_name in services:
+        unit_file = os.path.join(config_dir, f"{service_name}.container")
+        if not os.path.exists(unit_file):
+            continue
+        with open(unit_file, "r") as f:
+            units[service_name] = store_blob(f.read())
+
+        container_name = get_container_name_for_service(service_name, compose_data)
+        result = subprocess.run(
+            ["podman", "inspect", "--format", "{{.Image}}", container_name],
+            capture_output=True,
+            text=True,
+        )
+        if result.returncode == 0 and result.stdout.strip():
+            images[service_name] = result.stdout.strip()
+
+    state = {"units": units, "images": images}
+
+    generations = list_generations(project_name)
+    for generation in reversed(generations):
+        if all(generation[k] == v for k, v in state.items()):
+            number = generation["generation"]
+            if number == get_active_generation(project_name):
+                print(f"  📦 Unchanged, still generation {number}")
+            else:
+                set_active_generation(project_name, number)
+                print(f"  📦 Matches generation {number}, now active")
+            return number
+
+    number = generations[-1]["generation"] + 1 if generations else 1
+    manifest = {
+        "generation": number,
+        "created": datetime.now().isoformat(timespec="seconds"),
+        **state,
+    }
+    project_dir = os.path.join(GENERATIONS_DIR, project_name)
+    os.makedirs(project_dir, mode=0o700, exist_ok=True)
+    write_file_atomic(
+        os.path.join(project_dir, f"{number}.json"), json.dumps(manifest, indent=2)
+    )
+    set_active_generation(project_name, number)
+    print(f"  📦 Recorded generation {number}")
+    return number
+
+
+def print_generations(project_name: str):
+    """List a project's generations."""
+    generations = list_generations(project_name)
+    if not generations:
+        print(f"No generations recorded for {project_name}.")
+        return
+
+    active = get_active_generation(project_name)
+    print(f"\nGenerations of {project_name}:")
+    for generation in generations:
+        marker = " (current)" if generation["generation"] == active else ""
+        print(
+            f"  {generation['generation']:>4}  {generation['created']}  "
+            f"{', '.join(sorted(generation['units']))}{marker}"
+        )
+    print()
+
+
+def rollback_project(project_name: str, generation: Optional[int] = None) -> bool:
+    """Restore a generation's units with pinned images, offline.
+
+    Defaults to the generation before the active one. Units get `Image=`
+    pinned to the recorded image ID so a moved tag cannot bring the broken
+    version back. Only services whose unit changed are restarted.
+    """
+    generations = list_generations(project_name)
+    if generation is None:
+        active = get_active_generation(project_name)
+        earlier = [g for g in generations if g["generation"] < (active or 0)]
+        if not earlier:
+            print(f"❌ No earlier generation of {project_name} to roll back to")
+            return False
+        target = earlier[-1]
+    else:
+        matches = [g for g in generations if g["generation"] == generation]
+        if not matches:
+            print(f"❌ Generation {generation} of {project_name} not found")
+            return False
+        target = matches[0]
+
+    print(f"⏪ Rolling back {project_name} to generation {target['generation']}")
+    config_dir = os.path.expanduser("~/.config/containers/systemd/")
+
+    changed = []
+    for service_name, digest in sorted(target["units"].items()):
+        content = load_blob(digest)
+        image_id = target["images"].get(service_name)
+        if image_id:
+            if (
+                subprocess.run(
+                    ["podman", "image", "exists", image_id], capture_output=True
+                ).returncode
+                != 0
+            ):
+                print(f"  ⚠️  Image {image_id[:12]} of {service_name} was removed")
+            else:
+                content = re.sub(
+                    r"^Image=.*$", f"Image={image_id}", content, flags=re.MULTILINE
+                )
+
+        unit_file = os.path.join(config_dir, f"{service_name}.container")
+        if write_file_atomic(unit_file, content, mode=0o644):
+            changed.append(service_name)
+
+    # The units on disk are the target's now, even if a restart fails
+    set_active_generation(project_name, target["generation"])
+
+    if not changed:
+        print("  ✅ Units already match, nothing to restart")
+        return True
+
+    reload_systemd()
+    for service_name in changed:
+        print(f"  🔁 Restarting {service_name}.service")
+        result = subprocess.run(
+            f"systemctl --user restart {service_name}.service",
+            shell=True,
+            capture_output=True,
+            text=True,
+        )
+        if result.returncode != 0:
+            print(f"    ❌ Could not restart: {result.stderr.strip()}")
+            return False
+
+    print(f"  ✅ Rolled back {', '.join(changed)}")
+    return True
+
+
+# ============================================================================
+# Log Report
+# ============================================================================
+
+
+def parse_podman_time(value: str) -> Optional[datetime]:
+    """Parse podman's RFC 3339 timestamps (nanoseconds are cut to micro)."""
+    match = re.match(r"(\S+?)(\.\d+)?([+-]\d\d:\d\d|Z)$", value)
+    if not match:
+        return None
+    fraction = (match.group(2) or "")[:7]
+    zone = "+00:00" if match.group(3) == "Z" else match.group(3)
+    try:
+        return datetime.fromisoformat(f"{match.group(1)}{fraction}{zone}")
+    except ValueError:
+        return None
+
+
+def get_journald_log_bytes(since_hours: float) -> Dict[str, int]:
+    """Sum message bytes per container written to the user journal."""
+    result = subprocess.run(
+        [
+            "journalctl",
+            "--user",
+            "--since",
+            f"-{int(since_hours * 3600)}s",
+            "--output",
+            "json",
+            "--output-fields",
+            "CONTAINER_NAME,MESSAGE",
+        ],
+        capture_output=True,
+        text=True,
+    )
+    totals = {}
+    for line in result.stdout.splitlines():
+        try:
+            entry = json.loads(line)
+        except json.JSONDecodeError:
+            continue
+        name = entry.get("CONTAINER_NAME")
+        message = entry.get("MESSAGE")
+        if not name or message is None:
+            continue
+        # Binary messages come as a list of byte values
+        size = len(message) if isinstance(message, list) else len(message.encode())
+        totals[name] = totals.get(name, 0) + size
+    return totals
+
+
+def log_report(since_hours: float = 1.0) -> List[dict]:
+    """Rank running containers by bytes logged per hour.
+
+    journald containers are measured over the last `since_hours` hours.
+    k8s-file containers are estimated from the current log file size over
+    the container's uptime, which undercounts after rotation.
+    """
+    ids = subprocess.run(
+        ["podman", "ps", "-q"], capture_output=True, text=True
+    ).stdout.split()
+    if not ids:
+        print("No running containers.")
+        return []
+
+    containers = json.loads(
+        subprocess.run(
+            ["podman", "inspect", *ids], capture_output=True, text=True, check=True
+        ).stdout
+    )
+    journald_bytes = None
+    now = datetime.now().astimezone()
+
+    rows = []
+    for container in containers:
+        name = container["Name"].lstrip("/")
+        log_config = container.get("HostConfig", {}).get("LogConfig", {})
+        driver = log_config.get("Type", "")
+        per_hour = None
+
+        if driver == "journald":
+            if journald_bytes is None:
+                journald_bytes = get_journald_log_bytes(since_hours)
+            per_hour = journald_bytes.get(name, 0) / since_hours
+        elif driver == "k8s-file" and log_config.get("Path"):
+            started = parse_podman_time(container["State"].get("StartedAt", ""))
+            try:
+                size = os.path.getsize(log_config["Path"])
+            except OSError:
+                size = None
+            if started and size is not None:
+                hours = max((now - started).total_seconds() / 3600, 1 / 60)
+                per_hour = size / hours
+
+        rows.append({"container": name, "driver": driver, "bytes_per_hour": per_hour})
+
+    rows.sort(key=lambda row: row["bytes_per_hour"] or 0, reverse=True)
+
+    print("\n" + "=" * 80)
+    print(f"{'CONTAINER':<36} {'DRIVER':<12} {'LOGGED/HOUR':>14}")
+    print("-" * 80)
+    for row in rows:
+        if row["bytes_per_hour"] is None:
+            rate = "unknown"
+        else:
+            rate = f"{row['bytes_per_hour'] / 1024:.1f} KiB"
+        print(f"{row['container']:<36} {row['driver']:<12} {rate:>14}")
+    print("=" * 80 + "\n")
+
+    return rows
+
+
+# ============================================================================
+# Access Log Latency Report
+# ============================================================================
+
+# Traefik's default "common" access log format
+ACCESS_LOG_PATTERN = re.compile(
+    r'^\S+ \S+ \S+ \[[^\]]+\] "[^"]*" (?P<status>\d{3}) (?P<size>\d+|-) '
+    r'"[^"]*" "[^"]*" \d+ "(?P<router>[^"]*)" "[^"]*" (?P<duration>\d+)ms'
+)
+
+
+class QuantileSketch:
+    """Log-bucketed latency histogram with bounded relative error.
+
+    Values land in buckets growing by a factor of gamma, so any quantile is
+    within `relative_accuracy` of the true value while memory only depends
+    on the range of values, not on how many were added (DDSketch).
+    """
+
+    def __init__(self, relative_accuracy: float = 0.01, buckets: dict = None):
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self.log_gamma = math.log(self.gamma)
+        self.buckets = {int(k): v for k, v in (buckets or {}).items()}
+        self.count = sum(self.buckets.values())
+
+    def add(self, value: float):
+        key = math.ceil(math.log(max(value, 1e-3)) / self.log_gamma)
+        self.buckets[key] = self.buckets.get(key, 0) + 1
+        self.count += 1
+
+    def quantile(self, q: float) -> Optional[float]:
+        if not self.count:
+            return None
+        rank = q * (self.count - 1)
+        seen = 0
+        for key in sorted(self.buckets):
+            seen += self.buckets[key]
+            if seen > rank:
+                return 2 * self.gamma**key / (self.gamma + 1)
+        return None
+
+    def to_dict(self) -> dict:
+        return {str(k): v for k, v in self.buckets.items()}
+
+
+def new_route_stats(service: Optional[str]) -> dict:
+    return {
+        "service": service,
+        "count": 0,
+        "bytes": 0,
+        "status": {},
+        "latency": QuantileSketch(),
+    }
+
+
+def load_access_log_state() -> dict:
+    """Load the saved log offset and per-router statistics windows."""
+    try:
+        with open(ACCESS_LOG_STATE_FILE, "r") as f:
+            state = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        state = {"inode": None, "offset": 0, "windows": []}
+
+    for window in state["windows"]:
+        for stats in window["routers"].values():
+            stats["latency"] = QuantileSketch(buckets=stats["latency"])
+    if not state["windows"]:
+        state["windows"].append(
+            {"label": "initial", "started": datetime.now().isoformat(), "routers": {}}
+        )
+    return state
+
+
+def save_access_log_state(state: dict):
+    serializable = {**state, "windows": []}
+    for window in state["windows"]:
+        routers = {
+            name: {**stats, "latency": stats["latency"].to_dict()}
+            for name, stats in window["routers"].items()
+        }
+        serializable["windows"].append({**window, "routers": routers})
+
+    os.makedirs(os.path.dirname(ACCESS_LOG_STATE_FILE), exist_ok=True)
+    write_file_atomic(ACCESS_LOG_STATE_FILE, json.dumps(serializable), mode=0o644)
+
+
+def parse_access_log_line(
+    line: str,
+) -> Optional[Tuple[str, Optional[str], int, int, float]]:
+    """Parse a common or JSON format line into (router, service, status, bytes, ms)."""
+    if line.startswith("{"):
+        try:
+            entry = json.loads(line)
+        except json.JSONDecodeError:
+            return None
+        if not entry.get("RouterName"):
+            return None
+        return (
+            entry["RouterName"].split("@")[0],
+            (entry.get("ServiceName") or "").split("@")[0] or None,
+            int(entry.get("DownstreamStatus", 0)),
+            int(entry.get("DownstreamContentSize", 0)),
+            entry.get("Duration", 0) / 1e6,
+        )
+
+    match = ACCESS_LOG_PATTERN.match(line)
+    if not match or match.group("router") in ("", "-"):
+        return None
+    size = match.group("size")
+    return (
+        match.group("router").split("@")[0],
+        None,
+        int(match.group("status")),
+        int(size) if size != "-" else 0,
+        float(match.group("duration")),
+    )
+
+
+def ingest_access_log(state: dict, log_path: str) -> int:
+    """Read new access log lines since the saved offset into the current window.
+
+    Rotation is detected by inode: the rest of the rotated file (`.1`) is
+    read first if it is still there, then the new file from the start. A
+    partial last line is left for the next run.
+    """
+    window = state["windows"][-1]["routers"]
+
+    def read_from(path: str, offset: int) -> Tuple[int, int]:
+        lines = 0
+        with open(path, "rb") as f:
+            f.seek(offset)
+            while True:
+                raw = f.readline()
+                if not raw.endswith(b"\n"):
+                    break
+                offset += len(raw)
+                parsed = parse_access_log_line(raw.decode(errors="replace").strip())
+                if not parsed:
+                    continue
+                router, service, status, size, duration = parsed
+                stats = window.setdefault(router, new_route_stats(service))
+                stats["count"] += 1
+                stats["bytes"] += size
+                status_class = f"{status // 100}xx"
+                stats["status"][status_class] = stats["status"].get(status_class, 0) + 1
+                stats["latency"].add(duration)
+                lines += 1
+        return offset, lines
+
+    st = os.stat(log_path)
+    offset = state["offset"]
+    lines = 0
+
+    if state["inode"] != st.st_ino:
+        rotated = f"{log_path}.1"
+        if (
+            state["inode"] is not None
+            and os.path.exists(rotated)
+            and os.stat(rotated).st_ino == state["inode"]
+        ):
+            lines += read_from(rotated, offset)[1]
+        offset = 0
+    elif st.st_size < offset:
+        offset = 0  # truncated in place
+
+    offset, new_lines = read_from(log_path, offset)
+    state["inode"] = st.st_ino
+    state["offset"] = offset
+    return lines + new_lines
+
+
+def get_router_projects(projects: Dict[str, dict]) -> Dict[str, Tuple[str, str]]:
+    """Map Traefik router names to (project, service) from compose labels."""
+    routers = {}
+    for project_name, project_info in projects.items():
+        dynamic = compile_traefik_labels(project_name, project_info["compose_data"])
+        for protocol in dynamic.values():
+            for router_name, router in protocol.get("routers", {}).items():
+                routers[router_name] = (project_name, router.get("service", ""))
+    return routers
+
+
+def mark_access_log_window(label: str, log_path: str = TRAEFIK_ACCESS_LOG):
+    """Close the current statistics window and start a new one.
+
+    Called before each update so the report can compare the traffic before
+    and after it. Only the last two windows are kept.
+    """
+    state = load_access_log_state()
+    try:
+        ingest_access_log(state, log_path)
+    except OSError as e:
+        print(f"  ⚠️  Could not read {log_path}: {e}")
+        return
+
+    state["windows"].append(
+        {"label": label, "started": datetime.now().isoformat(), "routers": {}}
+    )
+    state["windows"] = state["windows"][-2:]
+    save_access_log_state(state)
+
+
+def latency_report(projects: Dict[str, dict], log_path: str = TRAEFIK_ACCESS_LOG):
+    """Print p50/p95/p99 latency, error rates and bytes per router.
+
+    The current window (since the last update) is compared against the one
+    before it.
+    """
+    state = load_access_log_state()
+    try:
+        lines = ingest_access_log(state, log_path)
+    except OSError as e:
+        print(f"❌ Could not read {log_path}: {e}")
+        return
+    save_access_log_state(state)
+
+    router_projects = get_router_projects(projects)
+    current = state["windows"][-1]
+    previous = state["windows"][-2] if len(state["windows"]) > 1 else None
+
+    print("\n" + "=" * 100)
+    print(f"Traefik latency since {current['started']} ({current['label']})")
+    print(f"{lines} new request(s) read from {log_path}")
+    print("=" * 100)
+    print(
+        f"{'ROUTER':<20} {'PROJECT':<14} {'SERVICE':<14} {'REQS':>7} "
+        f"{'P50':>8} {'P95':>8} {'P99':>8} {'4XX':>6} {'5XX':>6} {'MB':>8}  ΔP95"
+    )
+    print("-" * 100)
+
+    for router_name, stats in sorted(
+        current["routers"].items(), key=lambda item: -item[1]["count"]
+    ):
+        project, service = router_projects.get(router_name, ("-", "-"))
+        service = stats["service"] or service or "-"
+        count = stats["count"]
+        sketch = stats["latency"]
+        p50, p95, p99 = (sketch.quantile(q) for q in (0.5, 0.95, 0.99))
+        rate_4xx = 100 * stats["status"].get("4xx", 0) / count
+        rate_5xx = 100 * stats["status"].get("5xx", 0) / count
+
+        delta = ""
+        before = previous["routers"].get(router_name) if previous else None
+        if before and before["latency"].count:
+            before_p95 = before["latency"].quantile(0.95)
+            delta = f"{(p95 - before_p95) / before_p95 * 100:+.0f}%"
+
+        print(
+            f"{router_name:<20} {project:<14} {service:<14} {count:>7} "
+            f"{p50:>6.0f}ms {p95:>6.0f}ms {p99:>6.0f}ms "
+            f"{rate_4xx:>5.1f}% {rate_5xx:>5.1f}% "
+            f"{stats['bytes'] / 1024 / 1024:>8.1f}  {delta}"
+        )
+    print("=" * 100 + "\n")
+
+
+# ============================================================================
+# Main Function
+# ============================================================================
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Manage Podman Compose projects with GCP secret integration",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  # List all available projects
+  %(prog)s --list
+
+  # Start specific projects
+  %(prog)s kener postgres
+
+  # Start all enabled projects
+  %(prog)s --all
+
+  # Use different GCP project
+  %(prog)s --all --project-id my-other-project
+
+  # Use different base directory
+  %(prog)s --all --base-dir ~/my-compose-files
+
+  # Dry run (show what would happen)
+  %(prog)s --all --dry-run
+
+  # Clean up old secrets
+  %(prog)s --cleanup
+
+  # Rotate changed secrets in place, reloading only affected services
+  %(prog)s --all --rotate-secrets
+
+  # Only regenerate Traefik file-provider configs from compose labels
+  %(prog)s --traefik-config
+
+  # Only sync Pi-hole local DNS records from Traefik Host() rules
+  %(prog)s --pihole-dns
+
+  # Stream database dumps (x-config.backup) into restic
+  %(prog)s --backup
+
+  # Roll out all enabled projects to their x-config.hosts concurrently
+  %(prog)s --all --rollout
+
+  # Rank containers by bytes logged per hour
+  %(prog)s --log-report
+
+  # Latency per Traefik router since the last update, compared to before it
+  %(prog)s --latency-report
+
+  # Roll back to the previous generation (or a given one) without network
+  %(prog)s --rollback kener
+  %(prog)s --rollback kener 3
+        """,
+    )
+
+    parser.add_argument(
+        "projects", nargs="*", help="Names of the projects to manage (folder names)"
+    )
+    parser.add_argument(
+        "--all",
+        action="store_true",
+        help="Manage all enabled projects (x-config.enabled=true)",
+    )
+    parser.add_argument(
+        "--list",
+        action="store_true",
+        help="List all discovered projects and their configuration",
+    )
+    parser.add_argument(
+        "--project-id",
+        default=GCP_PROJECT_ID,
+        help=f"GCP Project ID (default: {GCP_PROJECT_ID})",
+    )
+    parser.add_argument(
+        "--base-dir",
+        default=COMPOSE_BASE_DIR,
+        help=f"Base directory for compose files (default: {COMPOSE_BASE_DIR})",
+    )
+    parser.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="Show what would be done without doing it",
+    )
+    parser.add_argument(
+        "--show-secrets",
+        action="store_true",
+        help="Show fetched secrets and generated compose file (use with --dry-run)",
+    )
+    parser.add_argument(
+        "--cleanup", action="store_true", help="Clean up old secrets from tmpfs"
+    )
+    parser.add_argument(
+        "--fetch-secrets-only",
+        action="store_true",
+        help="Only fetch secrets without starting services (boot fallback when "
+        "boot_secrets.py has no manifest yet)",
+    )
+    parser.add_argument(
+        "--rotate-secrets",
+        action="store_true",
+        help="Update changed secrets in tmpfs and apply x-config.reload actions "
+        "without recreating containers",
+    )
+    parser.add_argument(
+        "--traefik-config",
+        action="store_true",
+        help=f"Only regenerate Traefik file-provider configs in "
+        f"{TRAEFIK_DYNAMIC_CONFIG_DIR} from compose labels",
+    )
+    parser.add_argument(
+        "--pihole-dns",
+        action="store_true",
+        help="Only sync Pi-hole local DNS records from Traefik Host() rules",
+    )
+    parser.add_argument(
+        "--backup",
+        action="store_true",
+        help="Stream database dumps from x-config.backup into restic "
+        "(all projects, or only the given ones)",
+    )
+    parser.add_argument(
+        "--backup-parallel",
+        type=int,
+        default=2,
+        help="Number of database dumps to run at once (default: 2)",
+    )
+    parser.add_argument(
+        "--rollout",
+        action="store_true",
+        help="Run the update on every host in x-config.hosts (local or over SSH)",
+    )
+    parser.add_argument(
+        "--yes",
+        action="store_true",
+        help="Start disabled projects given by name without asking",
+    )
+    parser.add_argument(
+        "--host",
+        default="local",
+        help="Name of this host in x-config.hosts, only projects placed on it "
+        "are managed (default: local, set by --rollout)",
+    )
+    parser.add_argument(
+        "--host-parallel",
+        type=int,
+        default=1,
+        help="Number of projects updated at once per host during --rollout "
+        "(default: 1)",
+    )
+    parser.add_argument(
+        "--start-parallel",
+        type=int,
+        default=4,
+        help="Maximum number of units started at once, fewer under pressure "
+        "(default: 4)",
+    )
+    parser.add_argument(
+        "--pressure-limits",
+        type=parse_pressure_thresholds,
+        default=PRESSURE_THRESHOLDS,
+        help="PSI some-avg10 percentages that hold back starts "
+        "(default: cpu=80,memory=20,io=40)",
+    )
+    parser.add_argument(
+        "--rollback",
+        nargs="+",
+        metavar=("PROJECT", "GENERATION"),
+        help="Restore units and pinned images of a previous generation",
+    )
+    parser.add_argument(
+        "--generations",
+        metavar="PROJECT",
+        help="List the recorded generations of a project",
+    )
+    parser.add_argument(
+        "--log-report",
+        action="store_true",
+        help="Rank running containers by bytes logged per hour",
+    )
+    parser.add_argument(
+        "--latency-report",
+        action="store_true",
+        help="Report p50/p95/p99 latency per Traefik router from its access log",
+    )
+    parser.add_argument(
+        "--service-account-key",
+        default=GCP_SERVICE_ACCOUNT_KEY,
+        help=f"Path to GCP service account key (default: {GCP_SERVICE_ACCOUNT_KEY})",
+    )
+
+    args = parser.parse_args()
+
+    with host_lock():
+        ensure_podman_secrets_service()
+
+    # Handle cleanup
+    if args.cleanup:
+        print("Cleaning up old secrets from tmpfs...")
+        cleanup_old_secrets()
+        print("✅ Cleanup complete\n")
+        return
+    if args.fetch_secrets_only:
+        fetch_all_secrets(args.base_dir, args.project_id, args.service_account_key)
+        return
+    if args.generations:
+        print_generations(args.generations)
+        return
+    if args.log_report:
+        log_report()
+        return
+    if args.rollback:
+        if len(args.rollback) > 2 or not (
+            len(args.rollback) == 1 or args.rollback[1].isdigit()
+        ):
+            parser.error("--rollback takes PROJECT [GENERATION]")
+        generation = int(args.rollback[1]) if len(args.rollback) == 2 else None
+        rollback_project(args.rollback[0], generation)
+        return
+
+    # Discover all projects
+    discovered_projects = discover_compose_projects(args.base_dir)
+
+    # Handle list
+    if args.list:
+        list_projects(args.base_dir)
+        return
+
+    # Everything below acts on this host only, except the rollout itself
+    if args.rollout:
+        all_projects = discovered_projects
+    else:
+        all_projects = {
+            name: info
+            for name, info in discovered_projects.items()
+            if is_placed_on(info, args.host)
+        }
+
+    if args.backup:
+        backup_projects = {
+            name: info
+            for name, info in all_projects.items()
+            if not args.projects or name in args.projects
+        }
+        backup_databases(backup_projects, args.backup_parallel, args.dry_run)
+        return
+
+    enabled_projects = {
+        name: info for name, info in all_projects.items() if info["config"]["enabled"]
+    }
+
+    if args.traefik_config:
+        print("Generating Traefik dynamic configs...")
+        write_traefik_dynamic_configs(args.base_dir, enabled_projects, args.dry_run)
+        return
+
+    if args.pihole_dns:
+        print("Syncing Pi-hole local DNS...")
+        update_pihole_local_dns(args.base_dir, all_projects, args.dry_run)
+        return
+
+    if args.latency_report:
+        latency_report(all_projects)
+        return
+
+    # Determine which projects to manage
+    if args.all:
+        # Get all enabled projects
+        projects_to_manage = dict(enabled_projects)
+        if not projects_to_manage:
+            print("No enabled projects found.")
+            print("Tip: Use --list to see all projects")
+            return
+    elif args.projects:
+        # Get specific projects
+        projects_to_manage = {}
+        for project_name in args.projects:
+            if project_name in discovered_projects and project_name not in all_projects:
+                hosts = get_project_hosts(discovered_projects[project_name])
+                print(
+                    f"⏭️  Project '{project_name}' is placed on {', '.join(hosts)}, "
+                    f"not {args.host} (use --rollout)"
+                )
+            elif project_name in all_projects:
+                if not all_projects[project_name]["config"]["enabled"]:
+                    print(
+                        f"⚠️  Warning: Project '{project_name}' is disabled (x-config.enabled=false)"
+                    )
+                    if not args.yes:
+                        response = input(f"   Start it anyway? (y/N): ")
+                        if response.lower() != "y":
+                            continue
+                projects_to_manage[project_name] = all_projects[project_name]
+            else:
+                print(f"❌ Project not found: {project_name}")
+                print(f"   Available projects: {', '.join(all_projects.keys())}")
+    else:
+        parser.print_help()
+        print("\n💡 Tip: Use --list to see all available projects")
+        return
+
+    if not projects_to_manage:
+        print("No projects to manage.")
+        return
+
+    if args.rollout:
+        rollout(
+            projects_to_manage,
+            args.base_dir,
+            args.host_parallel,
+            args.dry_run,
+            args.pressure_limits,
+            [
+                "--project-id",
+                args.project_id,
+                "--service-account-key",
+                args.service_account_key,
+                "--start-parallel",
+                str(args.start_parallel),
+                "--pressure-limits",
+                ",".join(f"{k}={v:g}" for k, v in args.pressure_limits.items()),
+            ],
+        )
+        return
+
+    # Activate GCP service account
+    if not args.dry_run or args.show_secrets or args.rotate_secrets:
+        try:
+            with host_lock():
+                activate_gcp_service_account(args.service_account_key, args.project_id)
+        except Exception as e:
+            print(f"❌ Failed to activate GCP service account: {e}")
+            return
+
+    if args.rotate_secrets:
+        for project_name, project_info in projects_to_manage.items():
+            rotate_project_secrets(
+                project_name, project_info, args.project_id, args.dry_run
+            )
+        if args.dry_run:
+            print("\n[DRY RUN] No changes made\n")
+            return
+        with host_lock():
+            write_boot_manifest(all_projects, args.project_id, args.service_account_key)
+        print("\n✅ Secret rotation complete\n")
+        return
+
+    # Create necessary directory
+    config_dir = os.path.expanduser("~/.config/containers/systemd/")
+    mkdir_p(config_dir)
+
+    # Split the latency statistics at this update for --latency-report
+    if not args.dry_run:
+        with host_lock():
+            mark_access_log_window(f"after update of {', '.join(projects_to_manage)}")
+
+    # Manage each project
+    # One throttle for the whole run, so starts continue at the learned limit
+    throttle = PressureThrottle(args.start_parallel, args.pressure_limits)
+
+    all_services = []
+    failed_services = []
+    for project_name, project_info in projects_to_manage.items():
+        services, failed = manage_project(
+            project_name,
+            project_info,
+            args.project_id,
+            args.dry_run,
+            args.show_secrets,
+            throttle,
+        )
+        all_services.extend(services)
+        failed_services.extend(f"{project_name}/{name}" for name in failed)
+    throttle.wait_idle()
+
+    if args.dry_run:
+        print("\n" + "=" * 80)
+        print("[DRY RUN] No changes made")
+        print("=" * 80 + "\n")
+        return
+
+    with host_lock():
+        # Routes of all enabled projects, not only the managed ones
+        print("\n" + "=" * 80)
+        print("Generating Traefik dynamic configs...")
+        write_traefik_dynamic_configs(args.base_dir, enabled_projects)
+
+        print("\nSyncing Pi-hole local DNS...")
+        update_pihole_local_dns(args.base_dir, all_projects)
+
+        print("\nWriting boot manifest...")
+        write_boot_manifest(all_projects, args.project_id, args.service_account_key)
+
+        # Reload systemd
+        print("\n" + "=" * 80)
+        print("Reloading systemd daemon...")
+        reload_systemd()
+        print("✅ Systemd reloaded")
+
+    # Start services
+    # Generated services (e.g. PgBouncer) use their service name as container
+    service_containers = {name: (name, 120) for name in all_services}
+    for project_info in projects_to_manage.values():
+        for service_name in project_info["services"]:
+            if service_name in all_services:
+                service_containers[service_name] = (
+                    get_container_name_for_service(
+                        service_name, project_info["compose_data"]
+                    ),
+                    project_info["config"]["healthcheck_timeout"],
+                )
+    if service_containers:
+        print(f"\nStarting {len(service_containers)} service(s)...")
+        start_services(service_containers, throttle)
+
+    print("\nEnabling secrets loader service...")
+    subprocess.run(
+        "systemctl --user enable podman-secrets-loader.service",
+        shell=True,
         check=True,
     )
 
@@ -914,7 +3396,10 @@ Examples:
     print("✅ Linger enabled")
 
     print("\n" + "=" * 80)
-    print("✓ All operations completed successfully!")
+    if failed_services:
+        print(f"❌ Blue-green update failed: {', '.join(failed_services)}")
+    else:
+        print("✓ All operations completed successfully!")
     print("=" * 80 + "\n")
 
 
@@ -940,5 +3425,29 @@ if __name__ == "__main__":
 
     # Clean up old secrets
     python3 update_systemd.py --cleanup
+
+    # Rotate secrets without recreating containers
+    python3 update_systemd.py --all --rotate-secrets
+
+    # Regenerate Traefik file-provider configs
+    python3 update_systemd.py --traefik-config
+
+    # Sync Pi-hole local DNS records
+    python3 update_systemd.py --pihole-dns
+
+    # Back up databases into restic
+    python3 update_systemd.py --backup
+
+    # Roll out to all hosts in x-config.hosts
+    python3 update_systemd.py --all --rollout
+
+    # Roll back a project to its previous generation
+    python3 update_systemd.py --rollback kener
+
+    # Show which containers log the most
+    python3 update_systemd.py --log-report
+
+    # Latency per Traefik router before/after the last update
+    python3 update_systemd.py --latency-report
     """
     main()